@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request query counts and timings (Server-Timing headers, /api/_metrics/),
+# off by default: set LISTINGS_INSTRUMENTATION=1 to enable
+if os.environ.get('LISTINGS_INSTRUMENTATION', '').lower() in ('1', 'true'):
+    MIDDLEWARE.insert(0, 'listings.instrumentation.InstrumentationMiddleware')
+
+# Statements repeated this many times in one request are flagged as N+1
+LISTINGS_DUPLICATE_QUERY_THRESHOLD = 3
+
 ROOT_URLCONF = 'alx_travel_app.urls'
 
 TEMPLATES = [
@@ -78,9 +87,78 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts so concurrent
+            # bookings queue up instead of failing mid-transaction, and use
+            # WAL so readers are not blocked while they wait
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
+# Database tuning profile (see listings.database): 'default', or
+# 'production' for persistent, health-checked connections with larger
+# caches and fewer fsyncs. Set LISTINGS_DB_PROFILE=production to enable
+LISTINGS_DB_PROFILE = os.environ.get('LISTINGS_DB_PROFILE', 'default').lower()
+if LISTINGS_DB_PROFILE == 'production':
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Read replicas (see listings.replicas), off by default: set
+# LISTINGS_READ_REPLICAS=N to serve safe requests' reads from N SQLite
+# copies of the database, refreshed with `manage.py sync_replicas`. Clients
+# read from the primary for LISTINGS_REPLICA_PIN_SECONDS after writing
+LISTINGS_READ_REPLICAS = []
+for number in range(1, int(os.environ.get('LISTINGS_READ_REPLICAS', '0')) + 1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db.{alias}.sqlite3',
+        # Tests read the test database through every alias
+        'TEST': {'MIRROR': 'default'},
+    }
+    LISTINGS_READ_REPLICAS.append(alias)
+if LISTINGS_READ_REPLICAS:
+    DATABASE_ROUTERS = ['listings.replicas.ReplicaRouter']
+    MIDDLEWARE.insert(0, 'listings.replicas.ReplicaMiddleware')
+LISTINGS_REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Point LISTINGS_CACHE_ALIAS at a shared backend (e.g. Redis) when running
+# more than one process, so invalidations reach every worker
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'alx-travel',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+LISTINGS_CACHE_ALIAS = 'default'
+LISTINGS_CACHE_TIMEOUT = 300
+
+
+# Background jobs (see listings.jobs), run by `manage.py runworker`. Set
+# LISTINGS_JOBS_INLINE=1 to run them in the web process after each commit
+# instead, without a worker
+LISTINGS_JOBS_INLINE = os.environ.get('LISTINGS_JOBS_INLINE', '').lower() in ('1', 'true')
+# Seconds before the first retry of a failed job, doubling per attempt
+LISTINGS_JOB_RETRY_DELAY = 10
+LISTINGS_JOB_MAX_RETRY_DELAY = 3600
+# Running jobs are claimed again after this many seconds
+LISTINGS_JOB_TIMEOUT = 600
+
+# Most items a bulk listing or booking import may carry (see listings.bulk)
+LISTINGS_BULK_MAX_ITEMS = 10000
+
+# Notification emails print to the console; configure SMTP in production
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -135,7 +213,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # JSONRenderer output, from orjson for plain collection pages
+        'listings.rendering.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
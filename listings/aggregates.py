@@ -0,0 +1,90 @@
+"""
+Maintenance of the denormalized rating columns on Listing and of
+ReviewSummary.
+
+Reviews update `rating_sum`, `review_count` and `average_rating` with a
+single F-expression UPDATE, so concurrent writers never lose increments
+and reads never have to touch the Review table. ReviewSummary star counts
+are shifted the same way; a listing's first review creates its row.
+"""
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.db.models.lookups import GreaterThan
+
+from .models import Listing, Review, ReviewSummary
+
+
+def apply_rating_change(listing_id, rating_delta, count_delta):
+    """Shift a listing's rating totals by the given deltas in one UPDATE"""
+    new_sum = F('rating_sum') + rating_delta
+    new_count = F('review_count') + count_delta
+    # Every right-hand side sees the pre-update row, so the average is
+    # derived from the new totals rather than the stored columns
+    return Listing.objects.filter(pk=listing_id).update(
+        rating_sum=new_sum,
+        review_count=new_count,
+        average_rating=Case(
+            When(GreaterThan(new_count, 0), then=Cast(new_sum, FloatField()) / new_count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+
+
+def recompute_ratings(queryset=None):
+    """Recompute rating totals from the Review table for the given listings"""
+    if queryset is None:
+        queryset = Listing.objects.all()
+    reviews = Review.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+    return queryset.update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+        review_count=Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total')), 0),
+        average_rating=Coalesce(
+            Subquery(reviews.annotate(mean=Avg('rating')).values('mean')), Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+
+
+def apply_summary_change(listing_id, added=None, removed=None, reviewed_at=None):
+    """
+    Shift a listing's ReviewSummary in one UPDATE: one review rated `added`
+    in, created at `reviewed_at`, and/or one rated `removed` out. Rebuilds
+    the row from the Review table if the listing has none yet.
+    """
+    changes = {}
+    if added in ReviewSummary.STARS:
+        changes[f'stars_{added}'] = F(f'stars_{added}') + 1
+    if removed in ReviewSummary.STARS:
+        name = f'stars_{removed}'
+        changes[name] = changes.get(name, F(name)) - 1
+    if reviewed_at is not None:
+        # GREATEST is NULL on SQLite when either side is
+        changes['latest_review_at'] = Coalesce(Greatest('latest_review_at', Value(reviewed_at)), Value(reviewed_at))
+    elif removed is not None and added is None:
+        # The removed review may have been the latest: one index seek
+        changes['latest_review_at'] = Subquery(
+            Review.objects.filter(listing=listing_id).order_by('-created_at').values('created_at')[:1]
+        )
+    if changes and not ReviewSummary.objects.filter(listing_id=listing_id).update(**changes):
+        recompute_review_summaries(Listing.objects.filter(pk=listing_id))
+
+
+def recompute_review_summaries(queryset=None):
+    """Rebuild the ReviewSummary rows of the given listings from the Review table"""
+    if queryset is None:
+        queryset = Listing.objects.all()
+    listings = queryset.order_by().values('pk')
+    summaries = (
+        Review.objects.filter(listing__in=listings).order_by().values('listing')
+        .annotate(
+            latest_review_at=Max('created_at'),
+            **{f'stars_{stars}': Count('pk', filter=Q(rating=stars)) for stars in ReviewSummary.STARS},
+        )
+    )
+    with transaction.atomic():
+        ReviewSummary.objects.filter(listing__in=listings).delete()
+        ReviewSummary.objects.bulk_create(
+            [ReviewSummary(listing_id=row.pop('listing'), **row) for row in summaries], batch_size=1000
+        )
@@ -0,0 +1,111 @@
+"""
+Normalized amenity index.
+
+Listing.amenities stays the source of truth for the API; every distinct
+name also gets an Amenity row (matched case-insensitively by its key) and
+every (listing, amenity) pair a ListingAmenity row. Requiring several
+amenities is then an intersection of (amenity, listing) index ranges
+instead of a scan over every listing's JSON.
+
+How each amenity joins the query depends on its share of listings,
+estimated over the newest SAMPLE_SIZE of them. A rare amenity drives the
+query: its listing ids come straight off the (amenity, listing) index, so
+counting them is cheap and only those rows are sorted. A common one is
+probed per candidate listing instead, so a page walks the listing index in
+order and stops once it is full, rather than sorting nearly every row.
+"""
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .models import Amenity, Listing, ListingAmenity
+
+# Listings (by newest id) the share of each filtered amenity is estimated over
+SAMPLE_SIZE = 10000
+
+# Amenities offered by at most this share of listings drive the query
+DRIVING_SHARE = 0.25
+
+
+def amenity_key(name):
+    """The case- and whitespace-insensitive form amenities are matched by"""
+    return ' '.join(str(name).split()).casefold()
+
+
+def _names(listing):
+    """The distinct amenity names of a listing, keyed by amenity_key"""
+    names = {}
+    for name in listing.amenities or []:
+        key = amenity_key(name)
+        if key:
+            names.setdefault(key, ' '.join(str(name).split()))
+    return names
+
+
+def get_amenities(names_by_key):
+    """Amenity rows for the given {key: name} pairs, created as needed, keyed by key"""
+    amenities = {amenity.key: amenity for amenity in Amenity.objects.filter(key__in=names_by_key)}
+    missing = [Amenity(key=key, name=name) for key, name in names_by_key.items() if key not in amenities]
+    if missing:
+        Amenity.objects.bulk_create(missing, ignore_conflicts=True)
+        amenities.update(
+            (amenity.key, amenity)
+            for amenity in Amenity.objects.filter(key__in=[amenity.key for amenity in missing])
+        )
+    return amenities
+
+
+def sync_listing_amenities(listing, created=False):
+    """Make the listing's ListingAmenity rows match its amenities"""
+    names = _names(listing)
+    amenities = get_amenities(names)
+    wanted = {amenities[key].pk for key in names}
+    existing = set() if created else set(
+        ListingAmenity.objects.filter(listing=listing).values_list('amenity_id', flat=True)
+    )
+    if existing - wanted:
+        ListingAmenity.objects.filter(listing=listing, amenity_id__in=existing - wanted).delete()
+    ListingAmenity.objects.bulk_create(
+        [ListingAmenity(listing=listing, amenity_id=amenity_id) for amenity_id in wanted - existing],
+        ignore_conflicts=True,
+    )
+
+
+def link_amenities(listings, batch_size=10000):
+    """Index freshly bulk-created listings, which never reach model signals"""
+    names = {}
+    for listing in listings:
+        for key, name in _names(listing).items():
+            names.setdefault(key, name)
+    amenities = get_amenities(names)
+    links = [
+        ListingAmenity(listing_id=listing.pk, amenity_id=amenities[key].pk)
+        for listing in listings
+        for key in _names(listing)
+    ]
+    ListingAmenity.objects.bulk_create(links, batch_size=batch_size, ignore_conflicts=True)
+    return len(links)
+
+
+def filter_amenities(queryset, names):
+    """Narrow a Listing queryset to listings offering every named amenity"""
+    keys = {amenity_key(name) for name in names} - {''}
+    if not keys:
+        return queryset
+    newest = Listing.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    amenities = list(
+        Amenity.objects.filter(key__in=keys)
+        .annotate(sampled=Count('listing_links', filter=Q(listing_links__listing_id__gt=newest - SAMPLE_SIZE)))
+        .order_by('sampled')
+    )
+    if len(amenities) < len(keys):
+        # Nobody offers an amenity that was never indexed
+        return queryset.none()
+    for index, amenity in enumerate(amenities):
+        if index == 0 and amenity.sampled <= DRIVING_SHARE * min(newest, SAMPLE_SIZE):
+            queryset = queryset.filter(
+                pk__in=ListingAmenity.objects.filter(amenity=amenity).values('listing_id')
+            )
+        else:
+            queryset = queryset.filter(Exists(
+                ListingAmenity.objects.filter(amenity=amenity, listing_id=OuterRef('pk'))
+            ))
+    return queryset
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ListingsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'listings'
+
+    def ready(self):
+        # Register model signal handlers, SQLite connection tuning and job handlers
+        from . import database, notifications, signals  # noqa: F401
@@ -0,0 +1,45 @@
+"""
+Per-listing occupancy index.
+
+Every night held by an active booking is a ListingNight row, unique per
+(listing, night). "Is listing X free?" is a range probe on that unique
+index, and "which listings are free?" is one anti-join against the
+(night, listing) index.
+"""
+from datetime import timedelta
+
+from .models import ListingNight
+
+
+def nights_between(check_in, check_out):
+    """The nights of a stay: check-in inclusive, check-out exclusive"""
+    return [check_in + timedelta(days=offset) for offset in range((check_out - check_in).days)]
+
+
+def occupied(check_in, check_out):
+    """ListingNight rows falling inside the stay"""
+    return ListingNight.objects.filter(night__gte=check_in, night__lt=check_out)
+
+
+def is_free(listing_id, check_in, check_out, exclude_booking=None):
+    """Whether no other booking holds any night of the stay"""
+    nights = occupied(check_in, check_out).filter(listing_id=listing_id)
+    if exclude_booking is not None and exclude_booking.pk:
+        nights = nights.exclude(booking_id=exclude_booking.pk)
+    return not nights.exists()
+
+
+def free_listings(queryset, check_in, check_out):
+    """Narrow a Listing queryset to listings with every night of the stay free"""
+    return queryset.exclude(pk__in=occupied(check_in, check_out).values('listing_id'))
+
+
+def sync_booking_nights(booking, created=False):
+    """Make the booking's ListingNight rows match its current stay"""
+    if not created:
+        ListingNight.objects.filter(booking=booking).delete()
+    if booking.stay is not None:
+        ListingNight.objects.bulk_create([
+            ListingNight(listing_id=booking.listing_id, booking=booking, night=night)
+            for night in nights_between(booking.check_in_date, booking.check_out_date)
+        ])
@@ -0,0 +1,1065 @@
+"""
+Benchmark scenarios for the listings app.
+
+Each scenario takes the parsed command options and returns a JSON-ready
+report. They run against a throwaway SQLite database created next to
+db.sqlite3 (see `benchmark_database`), never against the development data.
+The `api` scenario can instead drive a running server given with --url.
+"""
+import asyncio
+import base64
+import io
+import itertools
+import json
+import math
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.test import Client, modify_settings, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from django.utils import timezone
+
+from .amenities import filter_amenities
+from .cache import invalidate_all
+from .facets import refresh_facets
+from .geo import haversine_distance, nearby_listings
+from .models import Listing, Booking, Review
+from .rendering import FastJSONRenderer, orjson, row_serializer
+from . import seeding
+from .serializers import ListingListSerializer, ReviewSerializer
+
+BENCHMARK_DB_NAME = settings.BASE_DIR / 'bench.sqlite3'
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """Point the default connection at a migrated benchmark database"""
+    old_name = connection.settings_dict['NAME']
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = str(BENCHMARK_DB_NAME)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+    try:
+        # The test client talks to "testserver"; DEBUG would log every query.
+        # Responses are not cached, so scenarios time the database path
+        with override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=['testserver'],
+            CACHES={**settings.CACHES, 'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            LISTINGS_CACHE_ALIAS='benchmark',
+        ):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def list_pages(total, limit=100):
+    """Numbers of the first `limit` pages of a /api/listings/ holding `total` listings"""
+    return range(1, min(limit, math.ceil(total / api_settings.PAGE_SIZE)) + 1)
+
+
+def ensure_dataset(listings, users=1000, bookings=None, reviews_per_listing=2, batch_size=5000, stdout=None):
+    """
+    Insert generated rows until the database holds `listings` listings,
+    through the same generator and batch insert as `manage.py seed --bulk`,
+    so the occupied nights, rating totals, review summaries and facet counts
+    match the rows
+    """
+    existing = Listing.objects.count()
+    if existing >= listings:
+        return existing
+
+    password = make_password('password123')
+    if User.objects.count() < users:
+        User.objects.bulk_create(
+            [User(username=f'bench{i}', password=password) for i in range(User.objects.count(), users)],
+            batch_size=batch_size,
+        )
+    user_ids = list(User.objects.order_by('pk').values_list('id', flat=True))
+    bookings = listings if bookings is None else bookings
+
+    tasks = seeding.batches(0, listings, bookings, reviews_per_listing * listings, batch_size, user_ids)
+    for seed, number, start, stop, *rest in tasks:
+        if stop <= existing:
+            continue
+        # Resume mid-batch where an earlier, smaller run stopped
+        rows = seeding.generate_batch((seed, number, max(start, existing), stop, *rest))
+        with transaction.atomic():
+            seeding.insert_batch(*rows)
+        if stdout:
+            stdout.write(f'Seeded {stop}/{listings} listings...')
+    # Queryset writes bypass the signals that expire cached responses
+    invalidate_all()
+    return listings
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(samples), 3), 'max_ms': round(max(samples), 3)}
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda fraction: round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99), 'max_ms': round(ordered[-1], 3)}
+
+
+def _hot_path_queries():
+    """The filter/sort shapes served by the viewsets, keyed by name"""
+    listing = Listing.objects.order_by('?').only('id', 'host_id', 'city').first()
+    window = date.today() + timedelta(days=30)
+    return {
+        'listing_list': Listing.objects.order_by('-created_at')[:10],
+        'available': Listing.objects.filter(is_available=True).order_by('-created_at')[:10],
+        'my_listings': Listing.objects.filter(host_id=listing.host_id).order_by('-created_at')[:10],
+        'city_type_price': Listing.objects.filter(
+            city=listing.city, property_type='villa', price_per_night__lte=200,
+        ).order_by('price_per_night')[:10],
+        'booking_overlap': Booking.objects.filter(
+            listing_id=listing.id, check_in_date__lt=window + timedelta(days=7), check_out_date__gt=window,
+        ),
+        'user_bookings': Booking.objects.filter(
+            Q(guest_id=listing.host_id) | Q(listing__in=Listing.objects.filter(host_id=listing.host_id))
+        ).order_by('-created_at')[:10],
+        'listing_reviews': Review.objects.filter(listing_id=listing.id).order_by('-created_at')[:10],
+    }
+
+
+def _measure(queries, repeat):
+    return {
+        name: {'plan': queryset.explain(), **_time(lambda: list(queryset.all()), repeat)}
+        for name, queryset in queries.items()
+    }
+
+
+def run_indexes(options, stdout):
+    """EXPLAIN and time the hot paths with and without the 0003 indexes"""
+    ensure_dataset(options['listings'], stdout=stdout)
+    queries = _hot_path_queries()
+    report = {'listings': Listing.objects.count(), 'with_indexes': _measure(queries, options['repeat'])}
+
+    # Reconnect after each schema change: SQLite keeps serving cached
+    # EXPLAIN statements prepared against the old schema
+    indexed = [(model, index) for model in (Listing, Booking, Review) for index in model._meta.indexes]
+    with connection.schema_editor() as editor:
+        for model, index in indexed:
+            editor.remove_index(model, index)
+    try:
+        connection.close()
+        report['without_indexes'] = _measure(queries, options['repeat'])
+    finally:
+        with connection.schema_editor() as editor:
+            for model, index in indexed:
+                editor.add_index(model, index)
+        connection.close()
+    return report
+
+
+def run_booking_contention(options, stdout):
+    """Fire overlapping booking requests from many threads and count double bookings"""
+    ensure_dataset(options['listings'], stdout=stdout)
+    hot_listings = list(Listing.objects.filter(is_available=True).order_by('pk')[:5])
+    guests = list(User.objects.order_by('pk')[:50])
+    # Stays start beyond anything ensure_dataset books
+    window_start = date.today() + timedelta(days=800)
+    started_at = timezone.now()
+    local = threading.local()
+
+    def book(seed):
+        rng = random.Random(seed)
+        listing = rng.choice(hot_listings)
+        if not hasattr(local, 'client'):
+            local.client = Client()
+            local.client.force_login(rng.choice([guest for guest in guests if guest.pk != listing.host_id]))
+        check_in = window_start + timedelta(days=rng.randint(0, 30))
+        start = time.perf_counter()
+        response = local.client.post('/api/bookings/', {
+            'listing_id': listing.pk,
+            'check_in_date': check_in.isoformat(),
+            'check_out_date': (check_in + timedelta(days=rng.randint(1, 4))).isoformat(),
+            'num_guests': 1,
+        })
+        elapsed = (time.perf_counter() - start) * 1000
+        connection.close()
+        return response.status_code, elapsed
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+        results = list(pool.map(book, range(options['requests'])))
+    wall = time.perf_counter() - wall_start
+
+    active = Booking.objects.filter(
+        listing__in=hot_listings, status__in=Booking.OCCUPYING_STATUSES, created_at__gte=started_at,
+    )
+    overlaps = active.filter(Exists(
+        active.filter(
+            listing_id=OuterRef('listing_id'),
+            check_in_date__lt=OuterRef('check_out_date'),
+            check_out_date__gt=OuterRef('check_in_date'),
+        ).exclude(pk=OuterRef('pk'))
+    )).count()
+    statuses = [code for code, _ in results]
+    latency = _percentiles([elapsed for _, elapsed in results])
+    errors = sum(1 for code in statuses if code not in (201, 400))
+    return {
+        'requests': len(results),
+        'workers': options['workers'],
+        'created': statuses.count(201),
+        'rejected': statuses.count(400),
+        'errors': errors,
+        'overlapping_bookings': overlaps,
+        'requests_per_second': round(len(results) / wall, 1),
+        'latency': latency,
+        'passed': overlaps == 0 and errors == 0 and latency['p99_ms'] <= options['max_p99_ms'],
+    }
+
+
+def run_pagination(options, stdout):
+    """Time page-number (OFFSET + COUNT) against keyset pages at growing depths"""
+    total = ensure_dataset(options['listings'], stdout=stdout)
+    client = Client()
+    ordered = Listing.objects.order_by('-created_at', 'id')
+    report = {'listings': total, 'depths': {}}
+    depth = 1000
+    depths = []
+    while depth < total:
+        depths.append(depth)
+        depth *= 10
+    depths.append(total - 10)
+
+    for depth in depths:
+        anchor = ordered.values('created_at', 'id')[depth - 1]
+        token = f"n|{anchor['created_at'].isoformat()}|{anchor['id']}"
+        cursor = base64.urlsafe_b64encode(token.encode()).decode()
+        report['depths'][depth] = {
+            'page_number': _time(lambda: client.get(f'/api/listings/?page={depth // 10 + 1}'), options['repeat']),
+            'page_number_no_count': _time(
+                lambda: client.get(f'/api/listings/?page={depth // 10 + 1}&count=false'), options['repeat']
+            ),
+            'keyset': _time(lambda: client.get('/api/listings/', {'cursor': cursor}), options['repeat']),
+        }
+    anchor = ordered.values('created_at', 'id')[depths[-1] - 1]
+    report['keyset_plan'] = ordered.filter(created_at__lte=anchor['created_at']).filter(
+        Q(created_at__lt=anchor['created_at']) | Q(id__gt=anchor['id'])
+    )[:11].explain()
+    return report
+
+
+def run_search(options, stdout):
+    """Time FTS5 search against the substring fallback for narrow and broad queries"""
+    total = ensure_dataset(options['listings'], stdout=stdout)
+    client = Client()
+    queries = {
+        'narrow': 'tokyo cabin fireplace',
+        'one_city': 'tokyo',
+        'city_and_type': 'paris villa',
+        'prefix': 'cab',
+    }
+    report = {'listings': total, 'queries': {}}
+    for name, query in queries.items():
+        url = f'/api/listings/search/?q={query}'
+        results = {'fts': _time(lambda: client.get(url), options['repeat'])}
+        results['matches'] = client.get(url).json()['count']
+        with override_settings(LISTINGS_SEARCH_BACKEND='listings.search.BasicSearchBackend'):
+            results['substring'] = _time(lambda: client.get(url), options['repeat'])
+        report['queries'][name] = {'q': query, **results}
+    return report
+
+
+def run_facets(options, stdout):
+    """Time faceted listing pages served from ListingFacet against a live GROUP BY pass"""
+    total = ensure_dataset(options['listings'], stdout=stdout)
+    client = Client()
+    start = time.perf_counter()
+    rows = refresh_facets()
+    report = {
+        'listings': total,
+        'facet_rows': rows,
+        'refresh_ms': round((time.perf_counter() - start) * 1000, 3),
+        'pages': {},
+    }
+    pages = {
+        'all': '',
+        'city': '&city=Paris',
+        'city_type_price': '&city=Paris&property_type=villa&max_price=200',
+        'guests_bedrooms': '&guests=4&bedrooms=2',
+    }
+
+    def sample(url):
+        samples = []
+        for _ in range(options['repeat']):
+            begin = time.perf_counter()
+            client.get(url)
+            samples.append((time.perf_counter() - begin) * 1000)
+        return _percentiles(samples)
+
+    for name, params in pages.items():
+        url = f'/api/listings/?facets=true{params}'
+        report['pages'][name] = {'materialized': sample(url)}
+        # An off-bucket price bound forces the live pass with the same results
+        report['pages'][name]['live'] = sample(f'{url}&min_price=0.01')
+    report['passed'] = all(page['materialized']['p99_ms'] <= options['max_p99_ms'] for page in report['pages'].values())
+    return report
+
+
+def run_amenities(options, stdout):
+    """Time amenity filters as ListingAmenity intersections against a scan of the JSON column"""
+    total = ensure_dataset(options['listings'], stdout=stdout)
+    client = Client()
+    filters = {
+        'everywhere': ['WiFi', 'Kitchen'],
+        'one': ['Pool'],
+        'two': ['Pool', 'Gym'],
+        'disjoint': ['Pool', 'Fireplace'],
+    }
+    report = {'listings': total, 'filters': {}}
+
+    def page(queryset):
+        return list(queryset.order_by('-created_at')[:20])
+
+    def sample(url):
+        samples = []
+        for _ in range(options['repeat']):
+            begin = time.perf_counter()
+            client.get(url)
+            samples.append((time.perf_counter() - begin) * 1000)
+        return _percentiles(samples)
+
+    for name, names in filters.items():
+        indexed = filter_amenities(Listing.objects.all(), names)
+        scanned = Listing.objects.all()
+        for amenity in names:
+            # How the filter ran before the index: a substring match on the JSON list
+            scanned = scanned.filter(amenities__icontains=f'"{amenity}"')
+        report['filters'][name] = {
+            'amenities': names,
+            'matches': indexed.count(),
+            'page': {
+                'indexed': _time(lambda: page(indexed), options['repeat']),
+                'json_scan': _time(lambda: page(scanned), options['repeat']),
+            },
+            'count': {
+                'indexed': _time(indexed.count, options['repeat']),
+                'json_scan': _time(scanned.count, options['repeat']),
+            },
+            'api': sample(f'/api/listings/?amenities={",".join(names)}'),
+            'plan': indexed.order_by('-created_at')[:20].explain(),
+        }
+    report['passed'] = all(
+        result['api']['p99_ms'] <= options['max_p99_ms'] for result in report['filters'].values()
+    )
+    return report
+
+
+def run_nearby(options, stdout):
+    """Time nearby searches prefiltered by the R*Tree and the (latitude, longitude) index against a full scan"""
+    total = ensure_dataset(options['listings'], stdout=stdout)
+    client = Client()
+    searches = {
+        'centre_1km': (48.8566, 2.3522, 1),
+        'centre_10km': (48.8566, 2.3522, 10),
+        'centre_50km': (48.8566, 2.3522, 50),
+        'outskirts_10km': (49.1566, 2.3522, 10),
+        'nowhere_10km': (0.0, -30.0, 10),
+    }
+    backends = {
+        'rtree': 'listings.geo.SQLiteRTreeBackend',
+        'btree': 'listings.geo.BoundingBoxBackend',
+    }
+    report = {'listings': total, 'searches': {}}
+
+    def sample(url):
+        samples = []
+        for _ in range(options['repeat']):
+            begin = time.perf_counter()
+            client.get(url)
+            samples.append((time.perf_counter() - begin) * 1000)
+        return _percentiles(samples)
+
+    for name, (latitude, longitude, radius) in searches.items():
+        url = f'/api/listings/nearby/?lat={latitude}&lng={longitude}&radius={radius}'
+        results = {'matches': client.get(url).json()['count']}
+        for backend, path in backends.items():
+            with override_settings(LISTINGS_GEO_BACKEND=path):
+                results[backend] = sample(url)
+                results[f'{backend}_plan'] = nearby_listings(
+                    Listing.objects.all(), latitude, longitude, radius
+                )[:20].explain()
+        # Every listing's distance, with no index to narrow the candidates
+        scan = Listing.objects.annotate(distance_km=haversine_distance(latitude, longitude)).filter(
+            distance_km__lte=radius, is_available=True,
+        ).order_by('distance_km', 'id')
+        results['scan'] = _time(lambda: (scan.count(), list(scan[:20])), min(options['repeat'], 3))
+        report['searches'][name] = {'lat': latitude, 'lng': longitude, 'radius_km': radius, **results}
+    report['passed'] = all(
+        search['rtree']['p99_ms'] <= options['max_p99_ms'] for search in report['searches'].values()
+    )
+    return report
+
+
+class _InProcessClient:
+    """Requests through Django's test client, logged in as `user` if given"""
+
+    def __init__(self, user=None):
+        self.client = Client()
+        if user is not None:
+            self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        if method == 'POST':
+            response = self.client.post(path, data, content_type='application/json')
+        else:
+            response = self.client.get(path)
+        return response.status_code, response.get('Server-Timing', '')
+
+    def close(self):
+        connection.close()
+
+
+class _LiveClient:
+    """Requests to a running server over HTTP, with basic auth if credentials are given"""
+
+    def __init__(self, url, credentials=None):
+        import requests
+
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        if credentials:
+            self.session.auth = tuple(credentials.split(':', 1))
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.url + path, json=data)
+        return response.status_code, response.headers.get('Server-Timing', '')
+
+    def close(self):
+        self.session.close()
+
+
+def _api_endpoints(ids, authenticated, writes):
+    """
+    (name, method, path template, body factory, expected statuses) for the
+    routes in listings/urls.py. `{listing}`, `{review}` and `{booking}`
+    are filled with a random id of that kind per request.
+    """
+    window = date.today() + timedelta(days=900)
+
+    def booking(rng):
+        check_in = window + timedelta(days=rng.randint(0, 365))
+        return {
+            'listing_id': rng.choice(ids['listing']),
+            'check_in_date': check_in.isoformat(),
+            'check_out_date': (check_in + timedelta(days=rng.randint(1, 7))).isoformat(),
+            'num_guests': 1,
+        }
+
+    endpoints = [
+        ('listings.list', 'GET', '/api/listings/', None, (200,)),
+        ('listings.list_filtered', 'GET', '/api/listings/?city=Paris&max_price=200&facets=true', None, (200,)),
+        ('listings.retrieve', 'GET', '/api/listings/{listing}/', None, (200,)),
+        ('listings.available', 'GET', '/api/listings/available/', None, (200,)),
+        ('listings.search', 'GET', '/api/listings/search/?q=villa', None, (200,)),
+        ('listings.nearby', 'GET', '/api/listings/nearby/?lat=48.8566&lng=2.3522&radius=2', None, (200,)),
+        ('listings.reviews', 'GET', '/api/listings/{listing}/reviews/', None, (200,)),
+        ('reviews.list', 'GET', '/api/reviews/', None, (200,)),
+        ('reviews.retrieve', 'GET', '/api/reviews/{review}/', None, (200,)),
+    ]
+    if authenticated:
+        endpoints += [
+            ('listings.my_listings', 'GET', '/api/listings/my_listings/', None, (200,)),
+            ('bookings.list', 'GET', '/api/bookings/', None, (200,)),
+            ('bookings.my_bookings', 'GET', '/api/bookings/my_bookings/', None, (200,)),
+            ('bookings.my_hosted_bookings', 'GET', '/api/bookings/my_hosted_bookings/', None, (200,)),
+        ]
+        if ids['booking']:
+            endpoints.append(('bookings.retrieve', 'GET', '/api/bookings/{booking}/', None, (200,)))
+    if authenticated and writes:
+        # Far-future stays; a clash with an earlier request is a valid 400
+        endpoints.append(('bookings.create', 'POST', '/api/bookings/', booking, (201, 400)))
+    return endpoints
+
+
+def _drive(make_client, ids, method, path, body, expected, requests, workers):
+    """Issue `requests` requests from `workers` threads, each with its own client"""
+    issued = itertools.count()
+
+    def worker(number):
+        rng = random.Random(number)
+        client = make_client()
+        results = []
+        try:
+            # next() on a shared count() is atomic, so each request is issued once
+            while next(issued) < requests:
+                url = path.format(**{kind: rng.choice(values) for kind, values in ids.items() if values})
+                start = time.perf_counter()
+                status, timing = client.request(method, url, body(rng) if body else None)
+                elapsed = (time.perf_counter() - start) * 1000
+                match = re.search(r'desc="(\d+) queries"', timing)
+                results.append((status, elapsed, int(match.group(1)) if match else None))
+        finally:
+            client.close()
+        return results
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = [result for batch in pool.map(worker, range(workers)) for result in batch]
+    wall = time.perf_counter() - wall_start
+
+    queries = [count for _, _, count in results if count is not None]
+    return {
+        'method': method,
+        'path': path,
+        'requests': len(results),
+        'errors': sum(1 for status, _, _ in results if status not in expected),
+        'requests_per_second': round(len(results) / wall, 1),
+        **_percentiles([elapsed for _, elapsed, _ in results]),
+        'queries_per_request': round(statistics.mean(queries), 2) if queries else None,
+    }
+
+
+def _regressions(report, baseline, tolerance):
+    """Endpoints whose p99 or throughput is more than `tolerance` percent worse than in `baseline`"""
+    regressions = []
+    for name, result in report['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        if result['p99_ms'] > before['p99_ms'] * (1 + tolerance / 100):
+            regressions.append({'endpoint': name, 'metric': 'p99_ms', 'baseline': before['p99_ms'], 'now': result['p99_ms']})
+        if result['requests_per_second'] < before['requests_per_second'] * (1 - tolerance / 100):
+            regressions.append({
+                'endpoint': name, 'metric': 'requests_per_second',
+                'baseline': before['requests_per_second'], 'now': result['requests_per_second'],
+            })
+    return regressions
+
+
+def run_api(options, stdout):
+    """
+    Load-test every API endpoint with concurrent clients: in process against
+    the benchmark database, or against a running server with --url
+    """
+    url = options.get('url')
+    if url:
+        make_client = lambda: _LiveClient(url, options.get('user'))
+        probe = make_client()
+        ids = {}
+        for kind, path in (
+            ('listing', '/api/listings/available/?fields=id&count=false&page={}'),
+            ('review', '/api/reviews/?fields=id&count=false&page={}'),
+            ('booking', '/api/bookings/my_bookings/?fields=id&count=false&page={}'),
+        ):
+            ids[kind] = []
+            for page in range(1, 6):
+                response = probe.session.get(probe.url + path.format(page))
+                if response.status_code != 200:
+                    break
+                ids[kind] += [row['id'] for row in response.json()['results']]
+        probe.close()
+        authenticated, writes = bool(options.get('user')), False
+        report = {'mode': 'live', 'url': url}
+    else:
+        total = ensure_dataset(options['listings'], stdout=stdout)
+        user = User.objects.filter(listings__isnull=False, bookings__isnull=False).order_by('pk').first()
+        make_client = lambda: _InProcessClient(user)
+        ids = {
+            'listing': list(Listing.objects.filter(is_available=True).values_list('pk', flat=True)[:500]),
+            'review': list(Review.objects.values_list('pk', flat=True)[:500]),
+            'booking': list(Booking.objects.filter(guest=user).values_list('pk', flat=True)[:50]),
+        }
+        authenticated, writes = user is not None, True
+        report = {'mode': 'in-process', 'listings': total}
+
+    report.update({'workers': options['workers'], 'endpoints': {}})
+    # Server-Timing headers report each request's query count
+    with modify_settings(MIDDLEWARE={'prepend': 'listings.instrumentation.InstrumentationMiddleware'}):
+        for name, method, path, body, expected in _api_endpoints(ids, authenticated, writes):
+            stdout.write(f'Driving {name}...')
+            report['endpoints'][name] = _drive(
+                make_client, ids, method, path, body, expected, options['requests'], options['workers']
+            )
+
+    report['passed'] = all(
+        result['errors'] == 0 and result['p99_ms'] <= options['max_p99_ms']
+        for result in report['endpoints'].values()
+    )
+    if options.get('baseline'):
+        with open(options['baseline']) as baseline:
+            report['regressions'] = _regressions(report, json.load(baseline), options['max_regression'])
+        report['passed'] = report['passed'] and not report['regressions']
+    return report
+
+
+def _wsgi_request(handler, url, method='GET', body=None, headers=None, delay=0):
+    """
+    Send one request through a WSGI handler like a WSGI server would,
+    holding the thread until the client has drained the response for
+    `delay` seconds; returns the status code
+    """
+    path, _, query = url.partition('?')
+    content = json.dumps(body).encode() if body is not None else b''
+    statuses = []
+    response = handler({
+        'REQUEST_METHOD': method, 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+        'wsgi.input': io.BytesIO(content), 'CONTENT_LENGTH': str(len(content)), 'CONTENT_TYPE': 'application/json',
+        **(headers or {}),
+    }, lambda status, headers, exc_info=None: statuses.append(int(status.split()[0])))
+    try:
+        for _ in response:
+            pass
+        time.sleep(delay)
+    finally:
+        # Fires request_finished, which closes the thread's connection
+        # unless CONN_MAX_AGE keeps it
+        response.close()
+    return statuses[0]
+
+
+def _wsgi_server(workers, delay):
+    """
+    Serve a path like a threaded WSGI server with `workers` threads, each
+    held until its client has drained the response for `delay` seconds
+    """
+    handler = WSGIHandler()
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    async def serve(url):
+        return await asyncio.get_running_loop().run_in_executor(pool, lambda: _wsgi_request(handler, url, delay=delay))
+    return serve, pool
+
+
+def _asgi_server(delay):
+    """Serve a path through Django's ASGI handler to a client draining the response for `delay` seconds"""
+    application = ASGIHandler()
+
+    async def serve(url):
+        path, _, query = url.partition('?')
+        received = []
+        status = None
+
+        async def receive():
+            if not received:
+                received.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # The client stays connected until the response is sent
+            await asyncio.Future()
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif not message.get('more_body'):
+                await asyncio.sleep(delay)
+
+        await application({
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', b'testserver')], 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+        }, receive, send)
+        return status
+    return serve
+
+
+async def _slow_clients(serve, ids, path, requests, clients):
+    """Issue `requests` requests from `clients` concurrent clients, each waiting for its previous response"""
+    issued = itertools.count()
+    results = []
+    peak_threads = threading.active_count()
+
+    async def client(number):
+        nonlocal peak_threads
+        rng = random.Random(number)
+        while next(issued) < requests:
+            url = path.format(**{kind: rng.choice(values) for kind, values in ids.items()})
+            start = time.perf_counter()
+            status = await serve(url)
+            results.append((status, (time.perf_counter() - start) * 1000))
+            peak_threads = max(peak_threads, threading.active_count())
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(clients)))
+    wall = time.perf_counter() - wall_start
+    return {
+        'requests': len(results),
+        'errors': sum(1 for status, _ in results if status != 200),
+        'requests_per_second': round(len(results) / wall, 1),
+        **_percentiles([elapsed for _, elapsed in results]),
+        'peak_threads': peak_threads,
+    }
+
+
+def run_asgi(options, stdout):
+    """
+    Serve listing reads to many concurrent slow clients: the sync viewsets
+    from --workers WSGI threads and under ASGI, and the async views under
+    ASGI. Both servers run in process, so the numbers compare the handlers
+    rather than any particular server.
+    """
+    total = ensure_dataset(options['listings'], stdout=stdout)
+    ids = {
+        'listing': list(Listing.objects.values_list('pk', flat=True)[:500]),
+        'page': list_pages(total),
+    }
+    endpoints = {
+        'list': ('/api/listings/?page={page}', '/api/async/listings/?page={page}'),
+        'retrieve': ('/api/listings/{listing}/', '/api/async/listings/{listing}/'),
+        'reviews': ('/api/listings/{listing}/reviews/', '/api/async/listings/{listing}/reviews/'),
+    }
+    delay = options['client_delay_ms'] / 1000
+    report = {
+        'listings': total,
+        'clients': options['clients'],
+        'wsgi_threads': options['workers'],
+        'client_delay_ms': options['client_delay_ms'],
+        'endpoints': {},
+    }
+
+    # The async views must answer exactly as the viewsets do
+    client = Client()
+    listing = ids['listing'][0]
+    report['identical_responses'] = all(
+        client.get(sync_path.format(listing=listing, page=2)).content
+        == client.get(async_path.format(listing=listing, page=2)).content.replace(b'/api/async/', b'/api/')
+        for sync_path, async_path in endpoints.values()
+    )
+
+    async def drive(serve, path):
+        return await _slow_clients(serve, ids, path, options['requests'], options['clients'])
+
+    for name, (sync_path, async_path) in endpoints.items():
+        stdout.write(f'Driving {name}...')
+        serve, pool = _wsgi_server(options['workers'], delay)
+        with pool:
+            results = {'wsgi': asyncio.run(drive(serve, sync_path))}
+        results['asgi_sync_views'] = asyncio.run(drive(_asgi_server(delay), sync_path))
+        results['asgi'] = asyncio.run(drive(_asgi_server(delay), async_path))
+        report['endpoints'][name] = results
+
+    # Latency here is mostly queueing behind the other clients, so only errors fail the run
+    report['passed'] = report['identical_responses'] and all(
+        result['errors'] == 0 for results in report['endpoints'].values() for result in results.values()
+    )
+    return report
+
+
+def run_serialization(options, stdout):
+    """
+    Time rendering 1000-row pages through DRF serializers against compiled
+    row serializers, with the stdlib encoder and with orjson
+    """
+    total = ensure_dataset(options['listings'], stdout=stdout)
+    rows_per_page = 1000
+    pages = {
+        'listings': (ListingListSerializer, Listing.objects.order_by('-created_at')),
+        'reviews': (ReviewSerializer, Review.objects.order_by('-created_at')),
+    }
+    report = {'listings': total, 'orjson': orjson is not None, 'rows_per_page': rows_per_page, 'pages': {}}
+
+    def stages(fetch, serialize, render):
+        timings = {'fetch_ms': [], 'serialize_ms': [], 'render_ms': []}
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            rows = fetch()
+            fetched = time.perf_counter()
+            data = serialize(rows)
+            serialized = time.perf_counter()
+            content = render(data)
+            rendered = time.perf_counter()
+            for name, elapsed in zip(timings, (fetched - start, serialized - fetched, rendered - serialized)):
+                timings[name].append(elapsed * 1000)
+        result = {name: round(statistics.median(samples), 3) for name, samples in timings.items()}
+        result['total_ms'] = round(sum(result.values()), 3)
+        return result, content
+
+    for name, (serializer_class, queryset) in pages.items():
+        serializer = serializer_class()
+        queryset = serializer.optimize_queryset(queryset, keep=['created_at'])
+        compiled = row_serializer(serializer, queryset)
+        # Pages are {'results': [...]} so FastJSONRenderer may use orjson
+        drf, drf_content = stages(
+            lambda: list(queryset[:rows_per_page]),
+            lambda rows: {'results': serializer_class(rows, many=True).data},
+            JSONRenderer().render,
+        )
+        rows_stdlib, stdlib_content = stages(
+            lambda: list(compiled.rows(queryset)[:rows_per_page]),
+            lambda rows: {'results': compiled.page(rows)},
+            JSONRenderer().render,
+        )
+        rows_fast, fast_content = stages(
+            lambda: list(compiled.rows(queryset)[:rows_per_page]),
+            lambda rows: {'results': compiled.page(rows)},
+            FastJSONRenderer().render,
+        )
+        report['pages'][name] = {
+            'drf': drf,
+            'rows_stdlib_json': rows_stdlib,
+            'rows_fast_json': rows_fast,
+            'speedup': round(drf['total_ms'] / rows_fast['total_ms'], 2),
+            'identical': drf_content == stdlib_content == fast_content,
+        }
+    report['passed'] = all(page['identical'] for page in report['pages'].values())
+    return report
+
+
+# Connection settings of each database profile, as settings.py applies them
+DATABASE_PROFILES = {
+    'default': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'production': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+}
+
+
+@contextmanager
+def _database_profile(name):
+    """Open new connections with a database profile's settings and PRAGMAs"""
+    # Every thread's connection is created from this same settings dict
+    saved = {key: connection.settings_dict.get(key) for key in DATABASE_PROFILES[name]}
+    connection.settings_dict.update(DATABASE_PROFILES[name])
+    connection.close()
+    try:
+        with override_settings(LISTINGS_DB_PROFILE=name):
+            yield
+    finally:
+        connection.close()
+        connection.settings_dict.update(saved)
+
+
+def _mixed_load(ids, reads, readers, writers, credentials):
+    """
+    `readers` threads issue `reads` listing reads through the WSGI handler
+    while `writers` threads keep posting bookings until they are done
+    """
+    handler = WSGIHandler()
+    issued = itertools.count()
+    done = threading.Event()
+    auth = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(credentials.encode()).decode()}
+    window = date.today() + timedelta(days=1500)
+    paths = ['/api/listings/?page={page}', '/api/listings/{listing}/', '/api/listings/{listing}/reviews/']
+
+    def read(number):
+        rng = random.Random(number)
+        results = []
+        try:
+            while next(issued) < reads:
+                url = rng.choice(paths).format(page=rng.choice(ids['page']), listing=rng.choice(ids['listing']))
+                start = time.perf_counter()
+                status = _wsgi_request(handler, url)
+                results.append((status == 200, (time.perf_counter() - start) * 1000))
+        finally:
+            connection.close()
+        return results
+
+    def write(number):
+        rng = random.Random(-number)
+        results = []
+        try:
+            while not done.is_set():
+                check_in = window + timedelta(days=rng.randint(0, 3650))
+                body = {
+                    'listing_id': rng.choice(ids['listing']),
+                    'check_in_date': check_in.isoformat(),
+                    'check_out_date': (check_in + timedelta(days=rng.randint(1, 7))).isoformat(),
+                    'num_guests': 1,
+                }
+                start = time.perf_counter()
+                # A clash with an earlier stay is a valid 400
+                status = _wsgi_request(handler, '/api/bookings/', 'POST', body, auth)
+                results.append((status in (201, 400), (time.perf_counter() - start) * 1000))
+        finally:
+            connection.close()
+        return results
+
+    def summary(results):
+        return {
+            'requests': len(results),
+            'errors': sum(1 for ok, _ in results if not ok),
+            'requests_per_second': round(len(results) / wall, 1),
+            **(_percentiles([elapsed for _, elapsed in results]) if results else {}),
+        }
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=readers + writers) as pool:
+        writes = [pool.submit(write, number) for number in range(writers)]
+        read_results = [result for batch in pool.map(read, range(readers)) for result in batch]
+        done.set()
+        write_results = [result for future in writes for result in future.result()]
+    wall = time.perf_counter() - wall_start
+    return {
+        'reads': summary(read_results),
+        'writes': summary(write_results),
+        'requests_per_second': round((len(read_results) + len(write_results)) / wall, 1),
+    }
+
+
+def run_sqlite(options, stdout):
+    """
+    Concurrent reads and writes through the WSGI handler under each
+    database profile: --workers reader threads and --writers writer
+    threads, with connections opened per request by the default profile
+    and kept by the production one
+    """
+    total = ensure_dataset(options['listings'], stdout=stdout)
+    ids = {
+        'listing': list(Listing.objects.filter(is_available=True).values_list('pk', flat=True)[:500]),
+        'page': list_pages(total),
+    }
+    report = {
+        'listings': total,
+        'readers': options['workers'],
+        'writers': options['writers'],
+        'profiles': {},
+    }
+    # Basic auth checks the password on every request; a fast hasher keeps
+    # that from hiding the database time
+    with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+        guest, _ = User.objects.get_or_create(username='bench_sqlite_guest')
+        guest.set_password('password123')
+        guest.save()
+        for name in DATABASE_PROFILES:
+            stdout.write(f'Driving the {name} profile...')
+            with _database_profile(name):
+                report['profiles'][name] = _mixed_load(
+                    ids, options['requests'], options['workers'], options['writers'],
+                    f'{guest.username}:password123',
+                )
+
+    default, production = report['profiles']['default'], report['profiles']['production']
+    # Readers and writers share the GIL: more writes per second can mean
+    # fewer reads, so the total is the headline number
+    report['speedup'] = {
+        kind: round(production[kind]['requests_per_second'] / default[kind]['requests_per_second'], 2)
+        for kind in ('reads', 'writes')
+        if default[kind]['requests_per_second']
+    }
+    report['speedup']['total'] = round(production['requests_per_second'] / default['requests_per_second'], 2)
+    report['passed'] = all(
+        profile[kind]['errors'] == 0 for profile in report['profiles'].values() for kind in ('reads', 'writes')
+    )
+    return report
+
+
+def run_bulk(options, stdout):
+    """
+    Create --items listings and --items bookings with one bulk request each,
+    against the same items posted one request at a time (timed on the first
+    --requests items). Everything created is deleted afterwards, so reruns
+    with --keepdb measure the same dataset.
+    """
+    total = ensure_dataset(options['listings'], stdout=stdout)
+    items = options['items']
+    singles = min(items, options['requests'])
+    listing_ids = list(Listing.objects.filter(is_available=True).order_by('pk').values_list('pk', flat=True)[:1000])
+    host, _ = User.objects.get_or_create(username='bench_bulk_host')
+    guest, _ = User.objects.get_or_create(username='bench_bulk_guest')
+    client = Client()
+    started_at = timezone.now()
+    # Two-night stays spread over the listings, past every existing booking
+    # so that none is rejected
+    window_start = (
+        Booking.objects.aggregate(last=Max('check_out_date'))['last'] or date.today()
+    ) + timedelta(days=1)
+
+    def listing_items(count, offset):
+        return [
+            {
+                'title': f'Bulk benchmark {offset + i}', 'description': 'Bulk benchmark listing.',
+                'address': '1 Main St', 'city': 'Paris', 'state': 'IDF', 'zipcode': '75001', 'country': 'FR',
+                'price_per_night': '120.00', 'bedrooms': 2, 'bathrooms': 1, 'max_guests': 4,
+                'property_type': 'apartment', 'amenities': ['WiFi', 'Kitchen'],
+            }
+            for i in range(count)
+        ]
+
+    def booking_items(count, offset):
+        stays = []
+        for i in range(offset, offset + count):
+            check_in = window_start + timedelta(days=3 * (i // len(listing_ids)))
+            stays.append({
+                'listing_id': listing_ids[i % len(listing_ids)],
+                'check_in_date': check_in.isoformat(),
+                'check_out_date': (check_in + timedelta(days=2)).isoformat(),
+                'num_guests': 1,
+            })
+        return stays
+
+    def post_each(path, batch):
+        statuses = []
+        start = time.perf_counter()
+        for item in batch:
+            statuses.append(client.post(path, item, content_type='application/json').status_code)
+        elapsed = time.perf_counter() - start
+        return {
+            'items': len(batch),
+            'created': statuses.count(201),
+            'ms': round(elapsed * 1000, 1),
+            'items_per_second': round(len(batch) / elapsed, 1),
+        }
+
+    def post_bulk(path, batch):
+        start = time.perf_counter()
+        response = client.post(path, batch, content_type='application/json')
+        elapsed = time.perf_counter() - start
+        return {
+            'items': len(batch),
+            'status': response.status_code,
+            'created': response.json().get('created', 0),
+            'ms': round(elapsed * 1000, 1),
+            'items_per_second': round(len(batch) / elapsed, 1),
+        }
+
+    report = {'listings': total, 'items': items, 'single_items': singles, 'endpoints': {}}
+    try:
+        for name, path, user, make_items in (
+            ('listings', '/api/listings/', host, listing_items),
+            ('bookings', '/api/bookings/', guest, booking_items),
+        ):
+            client.force_login(user)
+            stdout.write(f'Posting {singles} {name} one at a time and {items} in bulk...')
+            single = post_each(path, make_items(singles, items))
+            bulk = post_bulk(f'{path}bulk/', make_items(items, 0))
+            report['endpoints'][name] = {
+                'single': single,
+                'bulk': bulk,
+                'speedup': round(bulk['items_per_second'] / single['items_per_second'], 1),
+            }
+    finally:
+        Booking.objects.filter(guest=guest, created_at__gte=started_at).delete()
+        Listing.objects.filter(host=host, created_at__gte=started_at).delete()
+    report['passed'] = all(
+        endpoint['single']['created'] == singles and endpoint['bulk']['created'] == items
+        for endpoint in report['endpoints'].values()
+    )
+    return report
+
+
+SCENARIOS = {
+    'indexes': run_indexes,
+    'booking_contention': run_booking_contention,
+    'pagination': run_pagination,
+    'search': run_search,
+    'facets': run_facets,
+    'amenities': run_amenities,
+    'nearby': run_nearby,
+    'api': run_api,
+    'asgi': run_asgi,
+    'serialization': run_serialization,
+    'sqlite': run_sqlite,
+    'bulk': run_bulk,
+}
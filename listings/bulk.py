@@ -0,0 +1,129 @@
+"""
+Bulk listing and booking imports.
+
+Each item is validated on its own by its serializer's fields, then the
+batch is checked against the database at once: one query loads every
+referenced listing and one the nights they already have booked, so
+thousands of bookings cost a few queries instead of a few each. Valid
+items are written with bulk_create in one transaction, together with what
+model signals do for single saves (amenity index, facet counts, occupied
+nights, notifications, cache expiry). Invalid items are skipped and reported with
+the errors a single POST would have returned.
+"""
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .amenities import link_amenities
+from .availability import nights_between, occupied
+from .cache import invalidate_collections, invalidate_listing
+from .facets import add_facets
+from .models import Booking, Listing, ListingNight
+from .notifications import notify_bookings
+from .serializers import BulkBookingSerializer, ListingSerializer
+
+
+def max_items():
+    return getattr(settings, 'LISTINGS_BULK_MAX_ITEMS', 10000)
+
+
+def _validate_items(serializer, items):
+    """(index, validated data) of the valid items, and errors by index of the others"""
+    valid, errors = [], {}
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, serializer.run_validation(item)))
+        except serializers.ValidationError as error:
+            errors[index] = error.detail
+    return valid, errors
+
+
+def _results(count, created, errors):
+    """Per-item outcomes, in request order"""
+    results = [None] * count
+    for index, pk in created:
+        results[index] = {'index': index, 'status': 201, 'id': pk}
+    for index, detail in errors.items():
+        results[index] = {'index': index, 'status': 400, 'errors': detail}
+    return results
+
+
+def create_listings(items, host, context=None):
+    """Create the valid listing items, hosted by `host`, returning per-item results"""
+    valid, errors = _validate_items(ListingSerializer(context=context or {}), items)
+    with transaction.atomic():
+        created = Listing.objects.bulk_create([Listing(host=host, **data) for _, data in valid], batch_size=1000)
+        # The search and spatial indexes follow through triggers
+        link_amenities(created)
+        add_facets(created)
+    if created:
+        invalidate_collections()
+    return _results(len(items), [(index, listing.pk) for (index, _), listing in zip(valid, created)], errors)
+
+
+def create_bookings(items, guest, context=None):
+    """
+    Create the valid booking items for `guest`, returning per-item results.
+    Items are checked in order, so a stay clashing with an earlier item of
+    the same batch is rejected like one clashing with an existing booking.
+    """
+    valid, errors = _validate_items(BulkBookingSerializer(context=context or {}), items)
+
+    def reject(index, message):
+        errors[index] = {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+
+    bookings = []
+    with transaction.atomic():
+        listing_ids = {data['listing_id'] for _, data in valid}
+        # Locked like single bookings lock their listing (perform_create)
+        listings = (
+            Listing.objects.select_for_update()
+            .only('pk', 'title', 'is_available', 'max_guests', 'price_per_night')
+            .order_by()
+            .in_bulk(listing_ids)
+        )
+        taken = set()
+        if valid:
+            taken = set(
+                occupied(min(data['check_in_date'] for _, data in valid), max(data['check_out_date'] for _, data in valid))
+                .filter(listing_id__in=listings)
+                .order_by()
+                .values_list('listing_id', 'night')
+            )
+
+        for index, data in valid:
+            listing = listings.get(data['listing_id'])
+            if listing is None:
+                reject(index, "Listing not found")
+                continue
+            if not listing.is_available:
+                reject(index, "This listing is not available")
+                continue
+            if data['num_guests'] > listing.max_guests:
+                reject(index, f"Maximum {listing.max_guests} guests allowed")
+                continue
+            nights = [(listing.pk, night) for night in nights_between(data['check_in_date'], data['check_out_date'])]
+            if not taken.isdisjoint(nights):
+                reject(index, "This listing is already booked for the selected dates")
+                continue
+            booking = Booking(guest=guest, total_price=listing.price_per_night * len(nights), **data)
+            # Booking.save would reach the listing through the relation
+            booking.listing = listing
+            if booking.stay is not None:
+                taken.update(nights)
+            bookings.append((index, booking))
+
+        created = Booking.objects.bulk_create([booking for _, booking in bookings], batch_size=1000)
+        ListingNight.objects.bulk_create(
+            [
+                ListingNight(listing_id=booking.listing_id, booking=booking, night=night)
+                for booking in created if booking.stay is not None
+                for night in nights_between(booking.check_in_date, booking.check_out_date)
+            ],
+            batch_size=5000,
+        )
+        notify_bookings(created)
+    for listing_id in {booking.listing_id for booking in created}:
+        invalidate_listing(listing_id, collection=False)
+    return _results(len(items), [(index, booking.pk) for index, booking in bookings], errors)
@@ -0,0 +1,164 @@
+"""
+Response cache for anonymous listing reads.
+
+Rendered JSON responses are cached under a key built from the request
+path, query string and Accept header plus version counters: one per
+listing for detail views and one for listing collections, under a global
+generation. Signal handlers bump the counters when listings, reviews or
+bookings change, so stale entries are never read again and simply expire.
+Bumps wait for the writer's transaction to commit: a read between a bump
+and the commit would still see the old data and cache it under the new
+version.
+The cache alias is configurable with LISTINGS_CACHE_ALIAS, so a shared
+backend can replace the default local-memory cache.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from . import instrumentation
+from .replicas import primary_reads
+
+GENERATION_KEY = 'listings:generation'
+COLLECTION_KEY = 'listings:collection'
+LISTING_KEY = 'listings:listing:{}'
+METRICS_KEY = 'listings:metrics:{}:{}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'LISTINGS_CACHE_ALIAS', 'default')]
+
+
+def _versions(*keys):
+    """Current value of each version counter, seeding any that are missing"""
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Seed from the clock so an evicted counter never reuses a value
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _increment(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def _bump(key):
+    """Bump a version counter once the current transaction, if any, commits"""
+    transaction.on_commit(lambda: _increment(key))
+
+
+def invalidate_listing(listing_id, collection=True):
+    """Expire cached responses for one listing, and listing collections"""
+    _bump(LISTING_KEY.format(listing_id))
+    if collection:
+        _bump(COLLECTION_KEY)
+
+
+def invalidate_collections():
+    """Expire cached listing collections, e.g. after listings are bulk created"""
+    _bump(COLLECTION_KEY)
+
+
+def invalidate_all():
+    """Expire every cached listing response, e.g. after bulk updates"""
+    _bump(GENERATION_KEY)
+
+
+def response_key(request, listing_id=None):
+    scope = COLLECTION_KEY if listing_id is None else LISTING_KEY.format(listing_id)
+    generation, version = _versions(GENERATION_KEY, scope)
+    query = sorted(request.GET.lists())
+    digest = hashlib.md5(
+        f"{request.path}|{query}|{request.META.get('HTTP_ACCEPT', '')}".encode()
+    ).hexdigest()
+    return f'listings:response:{generation}:{version}:{digest}'
+
+
+def record(action, hit):
+    """Count a cache hit or miss for a viewset action"""
+    cache = get_cache()
+    key = METRICS_KEY.format(action, 'hits' if hit else 'misses')
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def cache_stats(actions):
+    """Hit and miss counts per action"""
+    cache = get_cache()
+    counts = cache.get_many([METRICS_KEY.format(action, kind) for action in actions for kind in ('hits', 'misses')])
+    return {
+        action: {kind: counts.get(METRICS_KEY.format(action, kind), 0) for kind in ('hits', 'misses')}
+        for action in actions
+    }
+
+
+def _is_anonymous(request):
+    user = getattr(request, 'user', None)
+    return 'HTTP_AUTHORIZATION' not in request.META and not (user and user.is_authenticated)
+
+
+def _finish(request, content, content_type, etag, state):
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    response['Vary'] = 'Accept'
+    response['X-Cache'] = state
+    return response
+
+
+class CachedReadMixin:
+    """
+    Serve anonymous GETs of `cached_actions` from the response cache, with
+    ETag / If-None-Match support. `pk` in the URL scopes an entry to that
+    listing's version counter.
+    """
+    cached_actions = ('list', 'retrieve', 'reviews', 'rating_summary')
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        if request.method != 'GET' or action not in self.cached_actions or not _is_anonymous(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = response_key(request, kwargs.get('pk'))
+        entry = cache.get(key)
+        record(action, hit=entry is not None)
+        if entry is not None:
+            return _finish(request, *entry, state='HIT')
+
+        # The entry outlives this request: fill it from the primary, since a
+        # lagging replica could answer with data from before the write that
+        # bumped the version
+        with primary_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            if hasattr(response, 'render'):
+                with instrumentation.span('render'):
+                    response.render()
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith('application/json'):
+            # The browsable API embeds per-request state
+            return response
+
+        etag = '"%s"' % hashlib.md5(response.content).hexdigest()
+        entry = (response.content, content_type, etag)
+        cache.set(key, entry, getattr(settings, 'LISTINGS_CACHE_TIMEOUT', 300))
+        return _finish(request, *entry, state='MISS')
@@ -0,0 +1,54 @@
+"""
+SQLite connection tuning.
+
+Every new SQLite connection gets the PRAGMAs of the database profile named
+by the LISTINGS_DB_PROFILE setting (from the environment variable of the
+same name). The default profile keeps SQLite's defaults apart from WAL,
+which OPTIONS['init_command'] enables. The production profile trades the
+last commits before a power loss for fewer fsyncs, and gives each
+connection a large page cache and memory map; settings.py also keeps its
+connections open across requests (CONN_MAX_AGE, with health checks), so
+that cache outlives a single request.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PROFILES = {
+    'default': {},
+    'production': {
+        # In WAL mode only a power loss can undo the latest commits
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        # Negative sizes are in KiB: 64 MiB per connection
+        'cache_size': -64 * 1024,
+        # Milliseconds, matching OPTIONS['timeout']
+        'busy_timeout': 20000,
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def profile_pragmas(profile=None):
+    """The PRAGMAs of a database profile, by default the configured one"""
+    profile = profile or getattr(settings, 'LISTINGS_DB_PROFILE', 'default')
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown LISTINGS_DB_PROFILE {profile!r}, expected one of {', '.join(PROFILES)}"
+        )
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    """Set the profile's PRAGMAs on a new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in profile_pragmas().items():
+        if not re.fullmatch(r'\w+', name) or not re.fullmatch(r'-?\w+', str(value)):
+            raise ImproperlyConfigured(f'Invalid SQLite PRAGMA {name}={value}')
+        connection.connection.execute(f'PRAGMA {name} = {value}')
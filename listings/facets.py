@@ -0,0 +1,198 @@
+"""
+Facet counts for listing collections.
+
+When a request only filters on the facet dimensions, counts are summed
+from the ListingFacet materialization, whose size depends on the number
+of distinct value combinations rather than listings: one query, a UNION
+ALL of one small GROUP BY per dimension. Listing signals move a listing
+between combinations as it is saved or deleted, and bulk inserts count
+theirs with `add_facets`; `manage.py refresh_facets` rebuilds the table,
+e.g. after QuerySet.update() calls, which bypass signals. Other filters (text, stay dates, amenities,
+off-bucket prices) fall back to a single GROUP BY pass over every
+dimension of the matching listings, rolled up per dimension in Python.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Case, CharField, Count, F, PositiveSmallIntegerField, Q, Subquery, Sum, Value, When,
+)
+
+from .models import Listing, ListingFacet
+
+# Lower bounds of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = [0, 100, 200, 300, 400]
+
+DIMENSIONS = ('city', 'country', 'property_type', 'bedrooms', 'max_guests', 'price_bucket')
+
+# ListingFacet columns identifying a combination
+COLUMNS = ('is_available', 'city', 'country', 'property_type', 'bedrooms', 'max_guests', 'price_bucket', 'at_bucket_start')
+
+# Filters the materialization can answer, besides bucket-aligned prices
+MATERIALIZED_FILTERS = {'city', 'country', 'property_type', 'bedrooms', 'guests', 'min_price', 'max_price'}
+
+
+def price_bucket():
+    """The index into PRICE_BUCKETS of a listing's price"""
+    return Case(
+        *[When(price_per_night__gte=low, then=Value(index)) for index, low in reversed(list(enumerate(PRICE_BUCKETS)))],
+        default=Value(0),
+        output_field=PositiveSmallIntegerField(),
+    )
+
+
+def refresh_facets():
+    """Rebuild the ListingFacet materialization, returning its row count"""
+    rows = (
+        Listing.objects.order_by()
+        .annotate(
+            price_bucket=price_bucket(),
+            at_bucket_start=Case(
+                When(price_per_night__in=PRICE_BUCKETS, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+        .values('is_available', *DIMENSIONS, 'at_bucket_start')
+        .annotate(count=Count('id'))
+    )
+    with transaction.atomic():
+        ListingFacet.objects.all().delete()
+        created = ListingFacet.objects.bulk_create([ListingFacet(**row) for row in rows])
+    return len(created)
+
+
+def facet_row(values):
+    """The ListingFacet combination, as column values, of a listing's Listing.facet_values"""
+    *fields, price = values
+    price = Decimal(str(price))
+    bucket = max((index for index, low in enumerate(PRICE_BUCKETS) if price >= low), default=0)
+    return (*fields, bucket, price in PRICE_BUCKETS)
+
+
+def _shift(row, delta):
+    """Add `delta` to the count of one ListingFacet row of the combination, returning whether one existed"""
+    combination = ListingFacet.objects.filter(**dict(zip(COLUMNS, row)))
+    return ListingFacet.objects.filter(pk=Subquery(combination.values('pk')[:1])).update(count=F('count') + delta)
+
+
+def apply_facet_change(added=None, removed=None):
+    """
+    Move one listing between combinations, given as Listing.facet_values:
+    counted in `added`, no longer in `removed`
+    """
+    if added is not None and removed is not None and facet_row(added) == facet_row(removed):
+        return
+    if removed is not None:
+        row = facet_row(removed)
+        _shift(row, -1)
+        ListingFacet.objects.filter(count=0, **dict(zip(COLUMNS, row))).delete()
+    if added is not None:
+        row = facet_row(added)
+        if not _shift(row, 1):
+            ListingFacet.objects.create(count=1, **dict(zip(COLUMNS, row)))
+
+
+def add_facets(listings, batch_size=1000):
+    """Count freshly bulk-created listings, which never reach model signals"""
+    counts = Counter(facet_row(listing.facet_values) for listing in listings)
+    if not counts:
+        return
+    existing = {}
+    for facet in ListingFacet.objects.filter(city__in={row[COLUMNS.index('city')] for row in counts}):
+        existing.setdefault(tuple(getattr(facet, column) for column in COLUMNS), facet)
+    changed, created = [], []
+    for row, count in counts.items():
+        facet = existing.get(row)
+        if facet is None:
+            created.append(ListingFacet(count=count, **dict(zip(COLUMNS, row))))
+        else:
+            facet.count = F('count') + count
+            changed.append(facet)
+    ListingFacet.objects.bulk_update(changed, ['count'], batch_size=batch_size)
+    ListingFacet.objects.bulk_create(created, batch_size=batch_size)
+
+
+def _materialized_totals(criteria, available_only):
+    """Per-dimension counts from ListingFacet, or None if it cannot answer"""
+    if criteria is None or not set(criteria) <= MATERIALIZED_FILTERS:
+        return None
+    facets = ListingFacet.objects.all()
+    for name in ('city', 'country', 'property_type'):
+        if name in criteria:
+            facets = facets.filter(**{name: criteria[name]})
+    if 'bedrooms' in criteria:
+        facets = facets.filter(bedrooms__gte=criteria['bedrooms'])
+    if 'guests' in criteria:
+        facets = facets.filter(max_guests__gte=criteria['guests'])
+    if 'min_price' in criteria:
+        if criteria['min_price'] not in PRICE_BUCKETS:
+            return None
+        facets = facets.filter(price_bucket__gte=PRICE_BUCKETS.index(criteria['min_price']))
+    if 'max_price' in criteria:
+        if criteria['max_price'] not in PRICE_BUCKETS:
+            return None
+        # Prices below the bound's bucket, plus those exactly on the bound
+        index = PRICE_BUCKETS.index(criteria['max_price'])
+        facets = facets.filter(Q(price_bucket__lt=index) | Q(price_bucket=index, at_bucket_start=True))
+    if available_only:
+        facets = facets.filter(is_available=True)
+    
+    per_dimension = [
+        facets.values(value=F(dimension))
+        .annotate(dimension=Value(dimension, output_field=CharField()), total=Sum('count'))
+        .values_list('dimension', 'value', 'total')
+        for dimension in DIMENSIONS
+    ]
+    totals = {dimension: {} for dimension in DIMENSIONS}
+    for dimension, value, count in per_dimension[0].union(*per_dimension[1:], all=True):
+        totals[dimension][value] = count
+    return totals
+
+
+def _live_totals(queryset):
+    """Per-dimension counts from one GROUP BY pass over the matching listings"""
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=price_bucket())
+        .values_list(*DIMENSIONS)
+        .annotate(count=Count('id'))
+    )
+    totals = {dimension: defaultdict(int) for dimension in DIMENSIONS}
+    for row in rows:
+        count = row[-1]
+        for dimension, value in zip(DIMENSIONS, row):
+            totals[dimension][value] += count
+    return totals
+
+
+def _bucket_label(index):
+    low = PRICE_BUCKETS[index]
+    high = PRICE_BUCKETS[index + 1] if index + 1 < len(PRICE_BUCKETS) else None
+    return {'min_price': low, 'max_price': high}
+
+
+def facet_counts(queryset, criteria=None, available_only=False):
+    """
+    Counts per value of each facet dimension for the listings in
+    `queryset`. Pass the validated ListingFilterSerializer data as
+    `criteria` when those filters are all that narrowed the queryset (plus
+    `available_only`), so the materialization may answer instead.
+    """
+    totals = _materialized_totals(criteria, available_only)
+    if totals is None:
+        totals = _live_totals(queryset)
+
+    facets = {}
+    for dimension in ('city', 'country', 'property_type'):
+        facets[dimension] = [
+            {'value': value, 'count': count}
+            for value, count in sorted(totals[dimension].items(), key=lambda item: (-item[1], item[0]))
+        ]
+    for dimension in ('bedrooms', 'max_guests'):
+        facets[dimension] = [{'value': value, 'count': count} for value, count in sorted(totals[dimension].items())]
+    facets['price'] = [
+        {**_bucket_label(index), 'count': count} for index, count in sorted(totals['price_bucket'].items())
+    ]
+    return facets
@@ -0,0 +1,47 @@
+"""
+Query-parameter filtering for listing collections.
+
+`?city=`, `?country=` and `?property_type=` match exactly, `?min_price=`
+and `?max_price=` bound the nightly price (inclusive), `?bedrooms=` and
+`?guests=` are minimums, and `?amenities=WiFi,Pool` requires every named
+amenity. City, property type and price are served by the composite
+(city, property_type, price_per_night) index, amenities by the
+normalized ListingAmenity index.
+"""
+from rest_framework.filters import BaseFilterBackend
+
+from .amenities import filter_amenities
+from .serializers import ListingFilterSerializer
+
+
+def filter_criteria(request):
+    """The validated filter parameters of a request, parsed once"""
+    if not hasattr(request, '_listing_filters'):
+        params = ListingFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        request._listing_filters = params.validated_data
+    return request._listing_filters
+
+
+class ListingFilterBackend(BaseFilterBackend):
+    """Apply the listing filters to collection actions"""
+
+    def filter_queryset(self, request, queryset, view):
+        if getattr(view, 'detail', False):
+            # Filters narrow collections; they never hide a single listing
+            return queryset
+        criteria = filter_criteria(request)
+        for name in ('city', 'country', 'property_type'):
+            if name in criteria:
+                queryset = queryset.filter(**{name: criteria[name]})
+        if 'min_price' in criteria:
+            queryset = queryset.filter(price_per_night__gte=criteria['min_price'])
+        if 'max_price' in criteria:
+            queryset = queryset.filter(price_per_night__lte=criteria['max_price'])
+        if 'bedrooms' in criteria:
+            queryset = queryset.filter(bedrooms__gte=criteria['bedrooms'])
+        if 'guests' in criteria:
+            queryset = queryset.filter(max_guests__gte=criteria['guests'])
+        if 'amenities' in criteria:
+            queryset = filter_amenities(queryset, criteria['amenities'])
+        return queryset
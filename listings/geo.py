@@ -0,0 +1,99 @@
+"""
+Nearby-listing search.
+
+A search for listings within `radius` km of a point runs in two steps.
+First a bounding box around the circle prefilters candidates through a
+spatial index. The backend is chosen with the LISTINGS_GEO_BACKEND setting
+(a dotted path): by default SQLite uses the R*Tree created by migration
+0008, other databases the (latitude, longitude) index. Then the exact
+great-circle (haversine) distance of each candidate is computed in SQL,
+which drops the box's corners and ranks the results nearest first.
+"""
+import math
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+from django.utils.module_loading import import_string
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def bounding_boxes(latitude, longitude, radius):
+    """
+    (min_lat, max_lat, min_lng, max_lng) boxes covering every point within
+    `radius` km: one box, or two when the circle crosses the antimeridian.
+    """
+    angle = radius / EARTH_RADIUS_KM
+    spread = math.degrees(angle)
+    min_lat, max_lat = latitude - spread, latitude + spread
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle covers a pole, and so every longitude
+        return [(max(min_lat, -90), min(max_lat, 90), -180, 180)]
+    # Half the longitude span between the meridians tangent to the circle
+    spread_lng = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude))))
+    min_lng, max_lng = longitude - spread_lng, longitude + spread_lng
+    if min_lng < -180:
+        return [(min_lat, max_lat, min_lng + 360, 180), (min_lat, max_lat, -180, max_lng)]
+    if max_lng > 180:
+        return [(min_lat, max_lat, min_lng, 180), (min_lat, max_lat, -180, max_lng - 360)]
+    return [(min_lat, max_lat, min_lng, max_lng)]
+
+
+def haversine_distance(latitude, longitude):
+    """Great-circle distance in km from the point to a listing's coordinates"""
+    phi = math.radians(latitude)
+    lat = Radians(F('latitude'))
+    half_chord = (
+        Power(Sin((lat - Value(phi)) / 2), 2)
+        + Value(math.cos(phi)) * Cos(lat) * Power(Sin((Radians(F('longitude')) - Value(math.radians(longitude))) / 2), 2)
+    )
+    # Rounding can nudge antipodal points just past 1
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Least(Sqrt(half_chord), Value(1.0)), output_field=FloatField())
+
+
+class BoundingBoxBackend:
+    """Prefilter on the (latitude, longitude) b-tree index"""
+
+    def within(self, queryset, boxes):
+        match = Q()
+        for min_lat, max_lat, min_lng, max_lng in boxes:
+            match |= Q(latitude__range=(min_lat, max_lat), longitude__range=(min_lng, max_lng))
+        return queryset.filter(match)
+
+
+class SQLiteRTreeBackend:
+    """Prefilter through the R*Tree over listing coordinates"""
+    table = 'listings_listing_rtree'
+
+    def within(self, queryset, boxes):
+        where = ' OR '.join(['(min_lat <= %s AND max_lat >= %s AND min_lng <= %s AND max_lng >= %s)'] * len(boxes))
+        params = []
+        for min_lat, max_lat, min_lng, max_lng in boxes:
+            params += [max_lat, min_lat, max_lng, min_lng]
+        # A subquery rather than a join, so it combines with other filters
+        return queryset.filter(pk__in=RawSQL(f'SELECT id FROM {self.table} WHERE {where}', params))
+
+
+def get_backend():
+    path = getattr(settings, 'LISTINGS_GEO_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteRTreeBackend()
+    return BoundingBoxBackend()
+
+
+def nearby_listings(queryset, latitude, longitude, radius):
+    """
+    Narrow a Listing queryset to listings within `radius` km of the point,
+    annotated with `distance_km` and ordered nearest first
+    """
+    queryset = get_backend().within(queryset, bounding_boxes(latitude, longitude, radius))
+    return (
+        queryset.annotate(distance_km=haversine_distance(latitude, longitude))
+        .filter(distance_km__lte=radius)
+        .order_by('distance_km', 'id')
+    )
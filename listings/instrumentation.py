@@ -0,0 +1,231 @@
+"""
+Per-request query and latency instrumentation.
+
+InstrumentationMiddleware (opt-in, see LISTINGS_INSTRUMENTATION in the
+settings) measures every request: SQL query count and time on every
+database connection, time spent in top-level serializers and rendering,
+and the total. Each response gets a Server-Timing header, and the numbers
+are aggregated per endpoint (the viewset and action, e.g.
+`ListingViewSet.list`) into fixed-bucket histograms served by
+/api/_metrics/. A statement repeated LISTINGS_DUPLICATE_QUERY_THRESHOLD
+times or more in one request is flagged as a likely N+1 pattern.
+
+Serializer and render spans may include queries they trigger, which are
+counted as database time too. Aggregates live in the process, so each
+worker reports its own traffic.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; the last bucket is open-ended
+DURATION_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Distinct flagged statements kept per endpoint
+MAX_FLAGGED_STATEMENTS = 20
+
+TIMINGS = ('total', 'db', 'serialize', 'render')
+
+_current = ContextVar('listings_request_metrics', default=None)
+_lock = threading.Lock()
+_endpoints = {}
+
+
+def duplicate_query_threshold():
+    return getattr(settings, 'LISTINGS_DUPLICATE_QUERY_THRESHOLD', 3)
+
+
+class Histogram:
+    """Counts of observations per bucket, plus their count and sum"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'mean': round(self.sum / self.count, 3) if self.count else None,
+            'buckets': [
+                {'le': bound, 'count': count}
+                for bound, count in zip(list(self.bounds) + [None], self.counts)
+            ],
+        }
+
+
+class EndpointStats:
+    """Aggregated measurements of one endpoint"""
+
+    def __init__(self):
+        self.timings = {name: Histogram(DURATION_BUCKETS_MS) for name in TIMINGS}
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.flagged_requests = 0
+        # Flagged SQL -> the most times it ran in one request
+        self.flagged_statements = {}
+
+    def add(self, metrics):
+        for name in TIMINGS:
+            self.timings[name].observe(getattr(metrics, f'{name}_ms'))
+        self.queries.observe(metrics.queries)
+        flagged = metrics.duplicates()
+        if flagged:
+            self.flagged_requests += 1
+            for sql, repeats in flagged.items():
+                if sql in self.flagged_statements or len(self.flagged_statements) < MAX_FLAGGED_STATEMENTS:
+                    self.flagged_statements[sql] = max(repeats, self.flagged_statements.get(sql, 0))
+
+    def as_dict(self):
+        return {
+            'requests': self.queries.count,
+            **{f'{name}_ms': histogram.as_dict() for name, histogram in self.timings.items()},
+            'queries': self.queries.as_dict(),
+            'duplicate_queries': {
+                'requests': self.flagged_requests,
+                'statements': [
+                    {'sql': sql, 'max_repeats': repeats}
+                    for sql, repeats in sorted(self.flagged_statements.items(), key=lambda item: -item[1])
+                ],
+            },
+        }
+
+
+class RequestMetrics:
+    """Measurements of the request being handled"""
+
+    def __init__(self):
+        self.endpoint = None
+        self.queries = 0
+        self.statements = Counter()
+        self.total_ms = self.db_ms = self.serialize_ms = self.render_ms = 0
+        self.render_started = None
+
+    def execute(self, execute, sql, params, many, context):
+        """A connection.execute_wrapper counting and timing each statement"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - start) * 1000
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """Statements that ran often enough to look like an N+1 pattern"""
+        threshold = duplicate_query_threshold()
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_ms:.1f}',
+            f'render;dur={self.render_ms:.1f}',
+            f'total;dur={self.total_ms:.1f}',
+        ])
+
+
+@contextmanager
+def span(name):
+    """Add the time spent in the block to the current request's `name` timing"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, f'{name}_ms', getattr(metrics, f'{name}_ms') + (time.perf_counter() - start) * 1000)
+
+
+def endpoint_name(request, view_func):
+    """`ViewSet.action` for DRF views, the dotted function name otherwise"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+
+
+def metrics_snapshot():
+    """The aggregated measurements of every endpoint, by endpoint name"""
+    with _lock:
+        return {name: stats.as_dict() for name, stats in sorted(_endpoints.items())}
+
+
+def reset_metrics():
+    with _lock:
+        _endpoints.clear()
+
+
+def is_enabled():
+    return f'{__name__}.InstrumentationMiddleware' in settings.MIDDLEWARE
+
+
+class InstrumentationMiddleware:
+    """Measure each request, add a Server-Timing header and aggregate per endpoint"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        metrics.total_ms = (time.perf_counter() - start) * 1000
+
+        # Streamed bodies are produced after this returns, so go unmeasured
+        if not response.streaming:
+            response['Server-Timing'] = metrics.server_timing()
+        if metrics.endpoint is not None:
+            self.record(metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.endpoint = endpoint_name(request, view_func)
+
+    def process_template_response(self, request, response):
+        # DRF responses render right after this hook returns
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self.rendered(metrics))
+        return response
+
+    def rendered(self, metrics):
+        metrics.render_ms += (time.perf_counter() - metrics.render_started) * 1000
+
+    def record(self, metrics):
+        flagged = metrics.duplicates()
+        for sql, repeats in flagged.items():
+            logger.warning('%s ran the same query %d times (possible N+1): %s', metrics.endpoint, repeats, sql)
+        with _lock:
+            _endpoints.setdefault(metrics.endpoint, EndpointStats()).add(metrics)
@@ -0,0 +1,205 @@
+"""
+Database-backed background jobs.
+
+`enqueue` adds a Job row in the caller's transaction, so a job exists
+exactly when the work that asked for it commits, and requests return
+without doing it. `manage.py runworker` claims due jobs and runs their
+handlers, registered with the `job` decorator:
+
+- Handlers registered with batch=True get the payloads of every claimed
+  job with the same name and listing in one call, so a burst of changes
+  to one listing costs one run.
+- A failing run is retried with exponential backoff
+  (LISTINGS_JOB_RETRY_DELAY seconds, doubling per attempt, at most
+  LISTINGS_JOB_MAX_RETRY_DELAY) and marked failed after its handler's
+  `max_attempts`.
+- A job given an idempotency key is enqueued once, however many times the
+  request enqueueing it is retried.
+- Jobs left running longer than LISTINGS_JOB_TIMEOUT seconds, e.g. by a
+  worker that died, are claimed again, or marked failed once they have
+  used up their `max_attempts`.
+
+With LISTINGS_JOBS_INLINE = True jobs run in the enqueueing process as
+soon as its transaction commits instead, which needs no worker (handy in
+development and tests).
+"""
+import logging
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+Handler = namedtuple('Handler', ['function', 'batch', 'max_attempts'])
+
+_handlers = {}
+
+
+def job(name, batch=False, max_attempts=5):
+    """Register a function as the handler of jobs called `name`"""
+    def register(function):
+        _handlers[name] = Handler(function, batch, max_attempts)
+        return function
+    return register
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a job that has failed `attempts` times"""
+    base = getattr(settings, 'LISTINGS_JOB_RETRY_DELAY', 10)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'LISTINGS_JOB_MAX_RETRY_DELAY', 3600))
+
+
+def enqueue(name, payload=None, listing_id=None, key=None, delay=0):
+    """
+    Queue a job with a JSON payload, to run in `delay` seconds at the
+    earliest. Returns the Job, or None if `key` was already used.
+    """
+    if name not in _handlers:
+        raise ValueError(f'No handler registered for job {name!r}')
+    new = Job(
+        name=name, payload=payload or {}, listing_id=listing_id, idempotency_key=key,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    try:
+        with transaction.atomic():
+            new.save()
+    except IntegrityError:
+        if key is not None and Job.objects.filter(idempotency_key=key).exists():
+            return None
+        raise
+    if getattr(settings, 'LISTINGS_JOBS_INLINE', False):
+        transaction.on_commit(lambda: run_now(new.pk))
+    return new
+
+
+def enqueue_many(name, jobs, batch_size=1000):
+    """
+    Queue many jobs with one INSERT per batch, from (payload, listing_id,
+    key) tuples, returning the new Jobs. Jobs whose key is already used are
+    skipped.
+    """
+    if name not in _handlers:
+        raise ValueError(f'No handler registered for job {name!r}')
+    keys = [key for _, _, key in jobs if key is not None]
+    seen = set(Job.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', flat=True)) if keys else set()
+    now = timezone.now()
+    new = []
+    for payload, listing_id, key in jobs:
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        new.append(Job(name=name, payload=payload or {}, listing_id=listing_id, idempotency_key=key, run_after=now))
+    try:
+        with transaction.atomic():
+            created = Job.objects.bulk_create(new, batch_size=batch_size)
+    except IntegrityError:
+        # A concurrent request has just used one of the keys
+        return [
+            queued for queued in (enqueue(name, job.payload, job.listing_id, job.idempotency_key) for job in new)
+            if queued is not None
+        ]
+    if created and getattr(settings, 'LISTINGS_JOBS_INLINE', False):
+        pks = [queued.pk for queued in created]
+        transaction.on_commit(lambda: run_now(*pks))
+    return created
+
+
+def claim(limit=100):
+    """Mark up to `limit` due jobs running, returning them"""
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'LISTINGS_JOB_TIMEOUT', 600))
+    with transaction.atomic():
+        # SQLite takes the write lock at BEGIN (transaction_mode IMMEDIATE),
+        # so concurrent workers claim one after another
+        due = (
+            Job.objects.filter(
+                Q(status='pending', run_after__lte=now) | Q(status='running', started_at__lt=stale)
+            )
+            .select_for_update(skip_locked=True)
+            .order_by('run_after', 'pk')
+            .values_list('pk', 'name', 'status', 'attempts')[:limit]
+        )
+        ids, timed_out = [], []
+        for pk, name, status, attempts in due:
+            # A run that killed or hung its worker never reaches _failed
+            handler = _handlers.get(name)
+            if status == 'running' and attempts >= (handler.max_attempts if handler is not None else 1):
+                timed_out.append(pk)
+            else:
+                ids.append(pk)
+        if timed_out:
+            Job.objects.filter(pk__in=timed_out).update(status='failed', finished_at=now, last_error='timed out')
+        Job.objects.filter(pk__in=ids).update(status='running', started_at=now, attempts=F('attempts') + 1)
+    return list(Job.objects.filter(pk__in=ids).order_by('run_after', 'pk'))
+
+
+def run_now(*pks):
+    """Claim and run jobs right away, except those a worker got to first"""
+    with transaction.atomic():
+        ids = list(
+            Job.objects.filter(pk__in=pks, status='pending')
+            .select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)
+        )
+        Job.objects.filter(pk__in=ids).update(status='running', started_at=timezone.now(), attempts=F('attempts') + 1)
+    if ids:
+        run_jobs(Job.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def run_jobs(jobs):
+    """Run claimed jobs, batching those with batched handlers by listing; returns how many succeeded"""
+    groups = {}
+    for claimed in jobs:
+        handler = _handlers.get(claimed.name)
+        if handler is not None and handler.batch:
+            groups.setdefault((claimed.name, claimed.listing_id), []).append(claimed)
+        else:
+            groups[(claimed.name, claimed.pk, None)] = [claimed]
+
+    succeeded = 0
+    for (name, *_), group in groups.items():
+        handler = _handlers.get(name)
+        try:
+            if handler is None:
+                raise LookupError(f'No handler registered for job {name!r}')
+            if handler.batch:
+                handler.function([claimed.payload for claimed in group])
+            else:
+                handler.function(group[0].payload)
+        except Exception:
+            logger.exception('Job %s failed (%d jobs)', name, len(group))
+            _failed(group, handler, traceback.format_exc())
+        else:
+            Job.objects.filter(pk__in=[claimed.pk for claimed in group]).update(
+                status='done', finished_at=timezone.now(), last_error=''
+            )
+            succeeded += len(group)
+    return succeeded
+
+
+def _failed(group, handler, error):
+    """Schedule each job of a failed run for a retry, or give it up"""
+    now = timezone.now()
+    max_attempts = handler.max_attempts if handler is not None else 1
+    for claimed in group:
+        if claimed.attempts >= max_attempts:
+            changes = {'status': 'failed', 'finished_at': now}
+        else:
+            changes = {'status': 'pending', 'run_after': now + timedelta(seconds=retry_delay(claimed.attempts))}
+        Job.objects.filter(pk=claimed.pk).update(last_error=error, **changes)
+
+
+def work(limit=100):
+    """Claim and run one round of due jobs, returning how many were claimed"""
+    jobs = claim(limit)
+    if jobs:
+        run_jobs(jobs)
+    return len(jobs)
@@ -0,0 +1,102 @@
+import json
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from listings.benchmarks import SCENARIOS, benchmark_database
+
+
+class Command(BaseCommand):
+    help = 'Run a performance benchmark scenario against a throwaway database and print a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenario',
+            choices=sorted(SCENARIOS),
+            help='Benchmark scenario to run'
+        )
+        parser.add_argument(
+            '--listings',
+            type=int,
+            default=100000,
+            help='Number of listings to seed before measuring (default: 100000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs per measurement (default: 5)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=16,
+            help='Number of concurrent client threads, or of WSGI server threads for asgi (default: 16)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=400,
+            help='Number of requests issued by concurrent scenarios (default: 400)'
+        )
+        parser.add_argument(
+            '--max-p99-ms',
+            type=float,
+            default=2000,
+            help='Latency budget above which a scenario fails (default: 2000)'
+        )
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=200,
+            help='asgi: number of concurrent slow clients (default: 200)'
+        )
+        parser.add_argument(
+            '--client-delay-ms',
+            type=float,
+            default=500,
+            help='asgi: time each client takes to drain a response (default: 500)'
+        )
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=4,
+            help='sqlite: number of threads posting bookings alongside the --workers readers (default: 4)'
+        )
+        parser.add_argument(
+            '--items',
+            type=int,
+            default=10000,
+            help='bulk: number of listings and of bookings per bulk request (default: 10000)'
+        )
+        parser.add_argument(
+            '--url',
+            help='api: load-test the server at this base URL (e.g. http://localhost:8000) instead of in process'
+        )
+        parser.add_argument(
+            '--user',
+            help='api: username:password for authenticated endpoints on --url'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='api: a previous JSON report to compare against; regressions fail the run'
+        )
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            default=20,
+            help='api: percent by which p99 or throughput may worsen against --baseline (default: 20)'
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the benchmark database (and its seeded rows) between runs'
+        )
+
+    def handle(self, *args, **options):
+        # A live server brings its own database
+        database = nullcontext() if options['url'] else benchmark_database(keepdb=options['keepdb'])
+        with database:
+            report = SCENARIOS[options['scenario']](options, self.stderr)
+        self.stdout.write(json.dumps(report, indent=2, default=str))
+        if report.get('passed') is False:
+            raise CommandError(f"Benchmark scenario '{options['scenario']}' failed its checks")
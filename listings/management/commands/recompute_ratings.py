@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from listings.aggregates import recompute_ratings, recompute_review_summaries
+from listings.cache import invalidate_all
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized rating columns on listings and their review summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of listings updated per transaction (default: 10000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+        
+        # Walk the primary key range so each transaction stays short
+        while True:
+            ids = list(
+                Listing.objects.filter(pk__gt=last_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            
+            with transaction.atomic():
+                listings = Listing.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+                updated += recompute_ratings(listings)
+                recompute_review_summaries(listings)
+            
+            last_id = ids[-1]
+            self.stdout.write(f'Recomputed {updated} listings...')
+        
+        # Queryset updates bypass the signals that expire cached responses
+        invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f'Successfully recomputed ratings for {updated} listings'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from listings.facets import refresh_facets
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed listing facet counts, e.g. after updating listings with QuerySet.update()'
+
+    def handle(self, *args, **options):
+        rows = refresh_facets()
+        self.stdout.write(self.style.SUCCESS(f'Successfully refreshed facet counts ({rows} rows)'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from listings.jobs import work
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (booking notifications and other deferred work)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Jobs claimed per round (default: 100)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when no job is due (default: 1)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no job is due instead of polling'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            claimed = work(options['batch_size'])
+            total += claimed
+            if claimed:
+                self.stdout.write(f'Ran {claimed} jobs ({total} so far)')
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully ran {total} jobs'))
@@ -1,8 +1,16 @@
 from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.utils import timezone
+from collections import deque
 from datetime import date, timedelta
+import multiprocessing
 import random
+import time
+from listings import seeding
+from listings.availability import is_free
+from listings.cache import invalidate_all
 from listings.models import Listing, Booking, Review
 
 
@@ -34,10 +42,38 @@ class Command(BaseCommand):
             default=50,
             help='Number of reviews to create (default: 50)'
         )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed, for reproducible data'
+        )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Insert rows with bulk_create in batches, for large datasets'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Listings generated and inserted per transaction with --bulk (default: 5000)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes generating rows with --bulk (default: 1)'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('Starting database seeding...')
         
+        if options['bulk']:
+            return self.bulk_seed(options)
+        
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        
         # Create users
         users = self.create_users(options['users'])
         
@@ -87,53 +123,30 @@ class Command(BaseCommand):
 
     def create_listings(self, count, users):
         """Create sample listings"""
-        cities = [
-            ('New York', 'NY', 'USA'),
-            ('Los Angeles', 'CA', 'USA'),
-            ('Chicago', 'IL', 'USA'),
-            ('Miami', 'FL', 'USA'),
-            ('San Francisco', 'CA', 'USA'),
-            ('Paris', 'Île-de-France', 'France'),
-            ('London', 'England', 'UK'),
-            ('Tokyo', 'Tokyo', 'Japan'),
-            ('Sydney', 'NSW', 'Australia'),
-            ('Toronto', 'ON', 'Canada'),
-        ]
-        
-        property_types = ['apartment', 'house', 'villa', 'cabin', 'condo']
-        
-        amenities_list = [
-            ['WiFi', 'Kitchen', 'Free parking'],
-            ['WiFi', 'Kitchen', 'Pool', 'Gym'],
-            ['WiFi', 'Kitchen', 'Balcony', 'Air conditioning'],
-            ['WiFi', 'Kitchen', 'Garden', 'BBQ'],
-            ['WiFi', 'Kitchen', 'Hot tub', 'Mountain view'],
-            ['WiFi', 'Kitchen', 'Beach access', 'Ocean view'],
-            ['WiFi', 'Kitchen', 'Fireplace', 'Ski storage'],
-            ['WiFi', 'Kitchen', 'Workspace', 'Coffee maker'],
-        ]
-        
         listings = []
         for i in range(count):
-            city, state, country = random.choice(cities)
-            property_type = random.choice(property_types)
+            city, state, country = random.choice(seeding.CITIES)
+            property_type = random.choice(seeding.PROPERTY_TYPES)
             host = random.choice(users)
+            latitude, longitude = seeding.coordinates(random, city)
             
             listing = Listing.objects.create(
                 title=f'Beautiful {property_type.title()} in {city}',
                 description=f'Stunning {property_type} located in the heart of {city}. '
                            f'Perfect for your next vacation with all the amenities you need.',
-                address=f'{random.randint(100, 9999)} {random.choice(["Main St", "Oak Ave", "Pine Rd", "Elm St"])}',
+                address=f'{random.randint(100, 9999)} {random.choice(seeding.STREETS)}',
                 city=city,
                 state=state,
                 zipcode=f'{random.randint(10000, 99999)}',
                 country=country,
+                latitude=latitude,
+                longitude=longitude,
                 price_per_night=random.randint(50, 500),
                 bedrooms=random.randint(1, 5),
                 bathrooms=random.randint(1, 4),
                 max_guests=random.randint(2, 12),
                 property_type=property_type,
-                amenities=random.choice(amenities_list),
+                amenities=random.choice(seeding.AMENITIES),
                 images=[
                     f'https://example.com/images/{property_type}_{i+1}_1.jpg',
                     f'https://example.com/images/{property_type}_{i+1}_2.jpg',
@@ -162,17 +175,19 @@ class Command(BaseCommand):
             if guest == listing.host:
                 continue
             
+            # Skip stays that would overlap an existing booking
+            status = random.choice(seeding.BOOKING_STATUSES)
+            if status in Booking.OCCUPYING_STATUSES and not is_free(listing.pk, start_date, end_date):
+                continue
+            
             booking = Booking.objects.create(
                 listing=listing,
                 guest=guest,
                 check_in_date=start_date,
                 check_out_date=end_date,
                 num_guests=random.randint(1, listing.max_guests),
-                status=random.choice(['pending', 'confirmed', 'completed', 'cancelled']),
-                special_requests=random.choice([
-                    '', 'Early check-in if possible', 'Late check-out requested',
-                    'Extra towels needed', 'Quiet room preferred'
-                ])
+                status=status,
+                special_requests=random.choice(seeding.SPECIAL_REQUESTS)
             )
             
             bookings.append(booking)
@@ -199,21 +214,90 @@ class Command(BaseCommand):
                 listing=listing,
                 reviewer=reviewer,
                 rating=random.randint(1, 5),
-                comment=random.choice([
-                    'Great place to stay! Highly recommended.',
-                    'Clean and comfortable. Perfect location.',
-                    'Amazing views and excellent amenities.',
-                    'Good value for money. Would stay again.',
-                    'Nice property but could use some updates.',
-                    'Fantastic experience! The host was very helpful.',
-                    'Beautiful property with everything we needed.',
-                    'Peaceful location with great amenities.',
-                    'Excellent communication with the host.',
-                    'Wonderful stay, exceeded our expectations.'
-                ])
+                comment=random.choice(seeding.REVIEW_COMMENTS)
             )
             
             reviews.append(review)
             self.stdout.write(f'Created review: {review}')
         
-        return reviews 
\ No newline at end of file
+        return reviews
+
+    def bulk_seed(self, options):
+        """
+        Seed large datasets: rows are generated in batches (optionally by a
+        pool of worker processes) and each batch is inserted with bulk_create
+        in one transaction by seeding.insert_batch, which also fills in what
+        signals would have (occupied nights, rating totals, summaries, ...).
+        """
+        seed = 0 if options['seed'] is None else options['seed']
+        user_ids = self.bulk_create_users(options['users'], options['batch_size'])
+        if not user_ids:
+            self.stdout.write(self.style.WARNING('No users to host listings'))
+            return
+        
+        tasks = seeding.batches(
+            seed, options['listings'], options['bookings'], options['reviews'],
+            options['batch_size'], user_ids,
+        )
+        counts = {'listings': 0, 'bookings': 0, 'reviews': 0}
+        started = time.perf_counter()
+        for rows in self.generate(tasks, options['workers']):
+            with transaction.atomic():
+                for name, created in zip(counts, seeding.insert_batch(*rows)):
+                    counts[name] += created
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Seeded {counts['listings']}/{options['listings']} listings "
+                f"({counts['listings'] / elapsed:.0f} listings/s)"
+            )
+        
+        # Queryset writes bypass the signals that expire cached responses
+        invalidate_all()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully seeded database with:\n'
+                f'- {len(user_ids)} users\n'
+                f"- {counts['listings']} listings\n"
+                f"- {counts['bookings']} bookings\n"
+                f"- {counts['reviews']} reviews"
+            )
+        )
+
+    def bulk_create_users(self, count, batch_size):
+        """Create user1..userN with one shared password hash, returning their ids"""
+        password = make_password('password123')
+        user_ids = []
+        for start in range(0, count, batch_size):
+            names = [f'user{i+1}' for i in range(start, min(start + batch_size, count))]
+            User.objects.bulk_create(
+                [
+                    User(
+                        username=name,
+                        email=f'{name}@example.com',
+                        first_name=f'User{name[4:]}',
+                        last_name=f'LastName{name[4:]}',
+                        password=password,
+                    )
+                    for name in names
+                ],
+                ignore_conflicts=True,
+            )
+            user_ids.extend(User.objects.filter(username__in=names).order_by('pk').values_list('pk', flat=True))
+        return user_ids
+
+    def generate(self, tasks, workers):
+        """Yield generated batches in order, from worker processes if asked"""
+        if workers <= 1:
+            yield from map(seeding.generate_batch, tasks)
+            return
+        
+        with multiprocessing.Pool(workers) as pool:
+            # Keep a bounded number of batches in flight so generation
+            # cannot run arbitrarily far ahead of the inserts
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(seeding.generate_batch, (task,)))
+                if len(pending) > workers * 2:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
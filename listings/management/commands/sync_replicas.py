@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from listings.replicas import replica_aliases, sync_replicas
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary database onto the read replicas (a local stand-in for replication)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Keep syncing every this many seconds instead of once'
+        )
+
+    def handle(self, *args, **options):
+        if not replica_aliases():
+            raise CommandError('No read replicas configured; set LISTINGS_READ_REPLICAS')
+        
+        while True:
+            started = time.perf_counter()
+            aliases = sync_replicas()
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.SUCCESS(f"Synced {', '.join(aliases)} in {elapsed:.0f}ms"))
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:52
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def backfill_listing_nights(apps, schema_editor):
+    Booking = apps.get_model('listings', 'Booking')
+    ListingNight = apps.get_model('listings', 'ListingNight')
+    bookings = Booking.objects.filter(
+        status__in=['pending', 'confirmed', 'completed']
+    ).order_by('pk').values_list('pk', 'listing_id', 'check_in_date', 'check_out_date')
+    batch = []
+    for booking_id, listing_id, check_in, check_out in bookings.iterator(chunk_size=2000):
+        batch.extend(
+            ListingNight(listing_id=listing_id, booking_id=booking_id, night=check_in + timedelta(days=offset))
+            for offset in range((check_out - check_in).days)
+        )
+        if len(batch) >= 10000:
+            # Earlier bookings keep a night that legacy data double-booked
+            ListingNight.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    ListingNight.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='listings.booking')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupied_nights', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['listing', 'night'],
+                'indexes': [models.Index(fields=['night', 'listing'], name='night_listing_idx')],
+                'unique_together': {('listing', 'night')},
+            },
+        ),
+        migrations.RunPython(backfill_listing_nights, migrations.RunPython.noop),
+    ]
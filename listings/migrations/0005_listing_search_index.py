@@ -0,0 +1,73 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:12
+
+from django.db import migrations
+
+# An external-content FTS5 index over listings_listing: it stores only the
+# inverted index and reads column values back from the listing rows.
+# Triggers keep it in step with every write, including bulk_create and
+# queryset updates, which never reach model signals.
+FTS_TABLE = 'listings_listing_fts'
+FTS_COLUMNS = 'title, description, city, amenities'
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        {FTS_COLUMNS}, content='listings_listing', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER listings_listing_fts_insert AFTER INSERT ON listings_listing BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {FTS_COLUMNS})
+        VALUES (new.id, new.title, new.description, new.city, new.amenities);
+    END
+    """,
+    f"""
+    CREATE TRIGGER listings_listing_fts_delete AFTER DELETE ON listings_listing BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, old.title, old.description, old.city, old.amenities);
+    END
+    """,
+    f"""
+    CREATE TRIGGER listings_listing_fts_update
+    AFTER UPDATE OF {FTS_COLUMNS} ON listings_listing BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, old.title, old.description, old.city, old.amenities);
+        INSERT INTO {FTS_TABLE}(rowid, {FTS_COLUMNS})
+        VALUES (new.id, new.title, new.description, new.city, new.amenities);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS listings_listing_fts_insert',
+    'DROP TRIGGER IF EXISTS listings_listing_fts_delete',
+    'DROP TRIGGER IF EXISTS listings_listing_fts_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases fall back to the basic search backend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_listing_nights'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_available', models.BooleanField()),
+                ('city', models.CharField(max_length=100)),
+                ('country', models.CharField(max_length=100)),
+                ('property_type', models.CharField(max_length=20)),
+                ('bedrooms', models.PositiveIntegerField()),
+                ('max_guests', models.PositiveIntegerField()),
+                ('price_bucket', models.PositiveSmallIntegerField()),
+                ('at_bucket_start', models.BooleanField()),
+                ('count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['city', '-created_at'], name='listing_city_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['country', '-created_at'], name='listing_country_created_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_listing_amenities(apps, schema_editor):
+    Amenity = apps.get_model('listings', 'Amenity')
+    ListingAmenity = apps.get_model('listings', 'ListingAmenity')
+    Listing = apps.get_model('listings', 'Listing')
+    # Few distinct names, so the whole map fits in memory
+    amenity_ids = {}
+    batch = []
+    for listing_id, names in Listing.objects.order_by('pk').values_list('pk', 'amenities').iterator(chunk_size=2000):
+        keys = set()
+        for name in names or []:
+            name = ' '.join(str(name).split())
+            key = name.casefold()
+            if not key or key in keys:
+                continue
+            keys.add(key)
+            if key not in amenity_ids:
+                amenity_ids[key] = Amenity.objects.get_or_create(key=key, defaults={'name': name})[0].pk
+            batch.append(ListingAmenity(listing_id=listing_id, amenity_id=amenity_ids[key]))
+        if len(batch) >= 10000:
+            ListingAmenity.objects.bulk_create(batch)
+            batch = []
+    ListingAmenity.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_listing_facets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Amenity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ListingAmenity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amenity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listing_links', to='listings.amenity')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='amenity_links', to='listings.listing')),
+            ],
+            options={
+                'unique_together': {('amenity', 'listing')},
+            },
+        ),
+        migrations.RunPython(backfill_listing_amenities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:01
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+# An R*Tree over listing coordinates, one zero-area box per located listing.
+# R*Tree stores 32-bit floats rounded outwards, so box queries may return
+# a few extra candidates but never miss one; exact distances come from the
+# listing columns. Triggers keep it in step with every write, like the
+# full-text index of migration 0005.
+RTREE_TABLE = 'listings_listing_rtree'
+
+CREATE_SQL = [
+    f"CREATE VIRTUAL TABLE {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    f"""
+    CREATE TRIGGER listings_listing_rtree_insert AFTER INSERT ON listings_listing
+    WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+        INSERT INTO {RTREE_TABLE} VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    f"""
+    CREATE TRIGGER listings_listing_rtree_delete AFTER DELETE ON listings_listing BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER listings_listing_rtree_update AFTER UPDATE OF latitude, longitude ON listings_listing BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.id;
+        INSERT INTO {RTREE_TABLE}
+        SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END
+    """,
+    f"""
+    INSERT INTO {RTREE_TABLE}
+    SELECT id, latitude, latitude, longitude, longitude FROM listings_listing
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS listings_listing_rtree_insert',
+    'DROP TRIGGER IF EXISTS listings_listing_rtree_delete',
+    'DROP TRIGGER IF EXISTS listings_listing_rtree_update',
+    f'DROP TABLE IF EXISTS {RTREE_TABLE}',
+]
+
+
+def create_spatial_index(apps, schema_editor):
+    # Other databases prefilter on the (latitude, longitude) index instead
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_spatial_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_listing_amenities'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['latitude', 'longitude'], name='listing_lat_lng_idx'),
+        ),
+        migrations.RunPython(create_spatial_index, drop_spatial_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def backfill_review_summaries(apps, schema_editor):
+    Review = apps.get_model('listings', 'Review')
+    ReviewSummary = apps.get_model('listings', 'ReviewSummary')
+    summaries = (
+        Review.objects.order_by().values('listing')
+        .annotate(
+            latest_review_at=Max('created_at'),
+            **{f'stars_{stars}': Count('pk', filter=Q(rating=stars)) for stars in range(1, 6)},
+        )
+    )
+    batch = []
+    for row in summaries.iterator(chunk_size=2000):
+        batch.append(ReviewSummary(listing_id=row.pop('listing'), **row))
+        if len(batch) >= 10000:
+            ReviewSummary.objects.bulk_create(batch)
+            batch = []
+    ReviewSummary.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSummary',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_summary', serialize=False, to='listings.listing')),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+                ('latest_review_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_review_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-17 08:10
+
+from django.db import migrations
+from django.db.models import BooleanField, Case, Count, PositiveSmallIntegerField, Value, When
+
+# listings.facets.PRICE_BUCKETS when the counts started following listing saves
+PRICE_BUCKETS = [0, 100, 200, 300, 400]
+
+
+def rebuild_listing_facets(apps, schema_editor):
+    """
+    Start the signal-maintained counts from the current listings rather than
+    the last refresh_facets run, or from nothing if it never ran
+    """
+    Listing = apps.get_model('listings', 'Listing')
+    ListingFacet = apps.get_model('listings', 'ListingFacet')
+    rows = (
+        Listing.objects.order_by()
+        .annotate(
+            price_bucket=Case(
+                *[When(price_per_night__gte=low, then=Value(index)) for index, low in reversed(list(enumerate(PRICE_BUCKETS)))],
+                default=Value(0),
+                output_field=PositiveSmallIntegerField(),
+            ),
+            at_bucket_start=Case(
+                When(price_per_night__in=PRICE_BUCKETS, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+        .values('is_available', 'city', 'country', 'property_type', 'bedrooms', 'max_guests', 'price_bucket', 'at_bucket_start')
+        .annotate(count=Count('id'))
+    )
+    ListingFacet.objects.all().delete()
+    ListingFacet.objects.bulk_create([ListingFacet(**row) for row in rows], batch_size=10000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_listing_facets, migrations.RunPython.noop),
+    ]
@@ -20,6 +20,13 @@ class Listing(models.Model):
     state = models.CharField(max_length=100)
     zipcode = models.CharField(max_length=20)
     country = models.CharField(max_length=100)
+    # WGS84 degrees; listings without coordinates never appear in nearby searches
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
     price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
     bedrooms = models.PositiveIntegerField()
     bathrooms = models.PositiveIntegerField()
@@ -29,14 +36,55 @@ class Listing(models.Model):
     images = models.JSONField(default=list)
     host = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings')
     is_available = models.BooleanField(default=True)
+    # Denormalized review aggregates, maintained by listings.signals
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='listing_created_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_available=True), name='listing_available_idx'),
+            models.Index(fields=['host', '-created_at'], name='listing_host_created_idx'),
+            models.Index(fields=['city', 'property_type', 'price_per_night'], name='listing_city_type_price_idx'),
+            # Filtered collection pages, already in -created_at order
+            models.Index(fields=['city', '-created_at'], name='listing_city_created_idx'),
+            models.Index(fields=['country', '-created_at'], name='listing_country_created_idx'),
+            # Bounding-box prefilter for nearby searches off SQLite (see listings.geo)
+            models.Index(fields=['latitude', 'longitude'], name='listing_lat_lng_idx'),
+        ]
+    
+    # Fields counted by ListingFacet (see listings.facets)
+    FACET_FIELDS = ('is_available', 'city', 'country', 'property_type', 'bedrooms', 'max_guests', 'price_per_night')
+    
+    # Persisted amenities, used to skip re-indexing unchanged listings
+    _original_amenities = None
+    # Persisted facet fields, or None if unknown (new, or loaded deferred)
+    _original_facet = None
     
     def __str__(self):
         return f"{self.title} - {self.city}, {self.country}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._original_amenities = instance.__dict__.get('amenities')
+        instance._original_facet = instance.loaded_facet_values()
+        return instance
+    
+    @property
+    def facet_values(self):
+        """The values of FACET_FIELDS, in order"""
+        return tuple(getattr(self, name) for name in self.FACET_FIELDS)
+    
+    def loaded_facet_values(self):
+        """facet_values, or None if any of them is deferred"""
+        if all(name in self.__dict__ for name in self.FACET_FIELDS):
+            return self.facet_values
+        return None
 
 
 class Booking(models.Model):
@@ -47,6 +95,8 @@ class Booking(models.Model):
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed'),
     ]
+    # Bookings in these states hold their nights in ListingNight
+    OCCUPYING_STATUSES = ('pending', 'confirmed', 'completed')
     
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='bookings')
     guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
@@ -61,6 +111,13 @@ class Booking(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['listing', 'check_in_date', 'check_out_date'], name='booking_listing_dates_idx'),
+            models.Index(fields=['guest', '-created_at'], name='booking_guest_created_idx'),
+        ]
+    
+    # Persisted stay, used by signal handlers to resync occupied nights
+    _original_stay = None
     
     def __str__(self):
         return f"Booking {self.id} - {self.listing.title} by {self.guest.username}"
@@ -71,6 +128,41 @@ class Booking(models.Model):
             nights = (self.check_out_date - self.check_in_date).days
             self.total_price = self.listing.price_per_night * nights
         super().save(*args, **kwargs)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(name in instance.__dict__ for name in ('listing_id', 'check_in_date', 'check_out_date', 'status')):
+            instance._original_stay = instance.stay
+        else:
+            # Deferred fields: force a resync on the next save
+            instance._original_stay = object()
+        return instance
+    
+    @property
+    def stay(self):
+        """The (listing_id, check_in_date, check_out_date) this booking occupies, if any"""
+        if self.status not in self.OCCUPYING_STATUSES:
+            return None
+        return (self.listing_id, self.check_in_date, self.check_out_date)
+
+
+class ListingNight(models.Model):
+    """One night of a listing held by a pending, confirmed or completed booking"""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='occupied_nights')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='nights')
+    night = models.DateField()
+    
+    class Meta:
+        ordering = ['listing', 'night']
+        # A night can only be held once per listing
+        unique_together = ['listing', 'night']
+        indexes = [
+            models.Index(fields=['night', 'listing'], name='night_listing_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.listing_id} on {self.night} (booking {self.booking_id})"
 
 
 class Review(models.Model):
@@ -84,9 +176,149 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Persisted values, used by signal handlers to apply rating deltas
+    _original_listing_id = None
+    _original_rating = None
+    
     class Meta:
         ordering = ['-created_at']
         unique_together = ['listing', 'reviewer']  # One review per user per listing
+        indexes = [
+            models.Index(fields=['listing', '-created_at'], name='review_listing_created_idx'),
+        ]
     
     def __str__(self):
         return f"Review by {self.reviewer.username} for {self.listing.title}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._original_listing_id = instance.__dict__.get('listing_id')
+        instance._original_rating = instance.__dict__.get('rating')
+        return instance
+
+
+class ReviewSummary(models.Model):
+    """
+    A listing's review counts per star rating and its latest review time,
+    maintained by listings.signals so rating widgets never read reviews.
+    A listing gets its row with its first review; having none means no
+    reviews.
+    """
+    STARS = range(1, 6)
+    
+    listing = models.OneToOneField(
+        Listing, on_delete=models.CASCADE, primary_key=True, related_name='review_summary'
+    )
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    latest_review_at = models.DateTimeField(null=True)
+    
+    def __str__(self):
+        return f"{self.review_count} reviews of {self.listing_id}"
+    
+    @property
+    def histogram(self):
+        """Review count by star rating"""
+        return {stars: getattr(self, f'stars_{stars}') for stars in self.STARS}
+    
+    @property
+    def review_count(self):
+        return sum(self.histogram.values())
+    
+    @property
+    def average_rating(self):
+        histogram = self.histogram
+        total = sum(histogram.values())
+        if not total:
+            return 0.0
+        return sum(stars * count for stars, count in histogram.items()) / total
+
+
+class Amenity(models.Model):
+    """A distinct amenity name, matched case-insensitively through `key`"""
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True)
+    
+    def __str__(self):
+        return self.name
+
+
+class ListingAmenity(models.Model):
+    """
+    One amenity of a listing: a normalized index of Listing.amenities,
+    maintained by listings.signals, so amenity filters are index lookups
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='amenity_links')
+    amenity = models.ForeignKey(Amenity, on_delete=models.CASCADE, related_name='listing_links')
+    
+    class Meta:
+        # (amenity, listing) lists an amenity's listings straight off the index
+        unique_together = ['amenity', 'listing']
+    
+    def __str__(self):
+        return f"{self.listing_id} has {self.amenity_id}"
+
+
+class ListingFacet(models.Model):
+    """
+    Listing counts per combination of facet values, kept in step with
+    listing saves and deletes (see listings.facets) and rebuilt by the
+    refresh_facets command. Facet counts for filters on these dimensions
+    are sums over a few thousand rows instead of a pass over every listing.
+    A combination may be split over several rows; counts are always summed.
+    """
+    is_available = models.BooleanField()
+    city = models.CharField(max_length=100)
+    country = models.CharField(max_length=100)
+    property_type = models.CharField(max_length=20)
+    bedrooms = models.PositiveIntegerField()
+    max_guests = models.PositiveIntegerField()
+    price_bucket = models.PositiveSmallIntegerField()
+    # Priced exactly at the bucket's lower bound, so inclusive max_price
+    # filters on a bound can still be answered from this table
+    at_bucket_start = models.BooleanField()
+    count = models.PositiveIntegerField()
+    
+    def __str__(self):
+        return f"{self.count} listings in {self.city} ({self.property_type})"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by `manage.py runworker` (see
+    listings.jobs). Finished jobs are kept so idempotency keys stay taken.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # Jobs of the same name and listing may run as one batch. A plain id
+    # rather than a foreign key, so jobs outlive their listing
+    listing_id = models.BigIntegerField(null=True, blank=True)
+    # Enqueueing a job whose key is taken is a no-op
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField()
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # Claiming due jobs, oldest first
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} job {self.pk} ({self.status})"
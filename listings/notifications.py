@@ -0,0 +1,81 @@
+"""
+Booking notification emails, sent by background jobs (see listings.jobs).
+
+Booking endpoints only enqueue a `booking_notifications` job per change.
+Jobs are batched by listing, so a host gets one email covering every
+change to a listing's bookings the worker picks up together, while each
+guest gets one about their own bookings.
+"""
+from django.conf import settings
+from django.core.mail import send_mass_mail
+
+from .jobs import enqueue, enqueue_many, job
+from .models import Booking
+
+STATUS_MESSAGES = {
+    'pending': 'was requested',
+    'confirmed': 'was confirmed',
+    'cancelled': 'was cancelled',
+    'completed': 'was completed',
+}
+
+
+def notify_booking(booking):
+    """Queue the emails announcing a booking's current status, once per status"""
+    return enqueue(
+        'booking_notifications',
+        {'booking': booking.pk, 'status': booking.status},
+        listing_id=booking.listing_id,
+        key=f'booking_notifications:{booking.pk}:{booking.status}',
+    )
+
+
+def notify_bookings(bookings):
+    """notify_booking for many bookings at once"""
+    enqueue_many('booking_notifications', [
+        (
+            {'booking': booking.pk, 'status': booking.status},
+            booking.listing_id,
+            f'booking_notifications:{booking.pk}:{booking.status}',
+        )
+        for booking in bookings
+    ])
+
+
+def _line(booking, status):
+    return (
+        f'Booking {booking.pk} at {booking.listing.title} '
+        f'({booking.check_in_date} to {booking.check_out_date}) {STATUS_MESSAGES.get(status, status)}.'
+    )
+
+
+@job('booking_notifications', batch=True)
+def send_booking_notifications(payloads):
+    """Email the listing's host one digest, and each guest their own changes"""
+    bookings = Booking.objects.select_related('listing__host', 'guest').in_bulk(
+        {payload['booking'] for payload in payloads}
+    )
+    host_lines = []
+    guest_lines = {}
+    for payload in payloads:
+        booking = bookings.get(payload['booking'])
+        if booking is None:
+            # Deleted since; nothing left to announce
+            continue
+        line = _line(booking, payload['status'])
+        host_lines.append((booking.listing.host, line))
+        guest_lines.setdefault(booking.guest, []).append(line)
+
+    messages = []
+    if host_lines:
+        host = host_lines[0][0]
+        if host.email:
+            messages.append((
+                f'{len(host_lines)} booking update(s) for your listing',
+                '\n'.join(line for _, line in host_lines),
+                settings.DEFAULT_FROM_EMAIL, [host.email],
+            ))
+    for guest, lines in guest_lines.items():
+        if guest.email:
+            messages.append(('Your booking', '\n'.join(lines), settings.DEFAULT_FROM_EMAIL, [guest.email]))
+    send_mass_mail(messages, fail_silently=False)
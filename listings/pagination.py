@@ -0,0 +1,210 @@
+"""
+Pagination for the listings API.
+
+Page-number pagination stays the default. Passing `?cursor=` switches a
+request to keyset pagination on (created_at, id), which seeks straight to
+the page through the created_at indexes instead of OFFSET-scanning, and
+`?count=false` drops the COUNT(*) from page-number responses. Both also
+paginate for async views with `apaginate_queryset`.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on (created_at, id), matching the models' -created_at
+    ordering. SQLite indexes store the rowid after created_at in ascending
+    order, so ordering ties by ascending id keeps every page an index seek.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, position = self.seek(queryset, request)
+        # One extra row tells us whether there is another page
+        return self.set_page(list(queryset[:self.page_size + 1]), position)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views, reading the page with the async ORM"""
+        queryset, position = self.seek(queryset, request)
+        return self.set_page([obj async for obj in queryset[:self.page_size + 1]], position)
+
+    def seek(self, queryset, request):
+        """Order and narrow the queryset to the rows after the cursor, returning it and the cursor"""
+        self.request = request
+        position = self.decode_cursor(request)
+        reverse = position is not None and position[0] == 'p'
+
+        if reverse:
+            queryset = queryset.order_by('created_at', '-id')
+        else:
+            queryset = queryset.order_by('-created_at', 'id')
+        if position is not None:
+            _, created_at, pk = position
+            if reverse:
+                queryset = queryset.filter(created_at__gte=created_at).filter(
+                    Q(created_at__gt=created_at) | Q(id__lt=pk)
+                )
+            else:
+                queryset = queryset.filter(created_at__lte=created_at).filter(
+                    Q(created_at__lt=created_at) | Q(id__gt=pk)
+                )
+        return queryset, position
+
+    def set_page(self, results, position):
+        """Keep the page out of the rows read (one more than a page), and note its neighbours"""
+        reverse = position is not None and position[0] == 'p'
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor('n', self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Walked past the end: step back to the first page
+            return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, '')
+        return self.encode_cursor('p', self.page[0])
+
+    def encode_cursor(self, direction, obj):
+        token = f'{direction}|{obj.created_at.isoformat()}|{obj.pk}'
+        token = base64.urlsafe_b64encode(token.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        """Return (direction, created_at, id), or None for the first page"""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            direction, created_at, pk = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+            if direction not in ('n', 'p'):
+                raise ValueError
+            return direction, datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class ListPagination(PageNumberPagination):
+    """
+    Page-number pagination that hands requests carrying `?cursor=` to
+    KeysetPagination, and skips the COUNT(*) when `?count=false` is given.
+    """
+    count_query_param = 'count'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        self.request = request
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        self.counted = request.query_params.get(self.count_query_param, '').lower() not in ('false', '0')
+        if self.counted:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size, offset = self.uncounted_window(request)
+        return self.set_uncounted_page(list(queryset[offset:offset + page_size + 1]), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset for async views: the same pages, with the count and
+        rows read through the async ORM
+        """
+        self.keyset = None
+        self.request = request
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        self.counted = request.query_params.get(self.count_query_param, '').lower() not in ('false', '0')
+        if self.counted:
+            paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+            # Counted up front, so the paginator never queries synchronously
+            paginator.count = await queryset.acount()
+            page_number = self.get_page_number(request, paginator)
+            try:
+                self.page = paginator.page(page_number)
+            except InvalidPage as exc:
+                raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+            self.page.object_list = [obj async for obj in self.page.object_list]
+            return list(self.page)
+
+        page_size, offset = self.uncounted_window(request)
+        return self.set_uncounted_page([obj async for obj in queryset[offset:offset + page_size + 1]], page_size)
+
+    def uncounted_window(self, request):
+        """The page size and offset of an uncounted page"""
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            self.number = int(page_number)
+            if self.number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message='Invalid page.'))
+        page_size = self.get_page_size(request)
+        return page_size, (self.number - 1) * page_size
+
+    def set_uncounted_page(self, results, page_size):
+        """Keep the page out of the rows read (one more than a page)"""
+        self.has_next = len(results) > page_size
+        self.display_page_controls = False
+        return results[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        if self.counted:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if self.counted:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.number + 1)
+
+    def get_previous_link(self):
+        if self.counted:
+            return super().get_previous_link()
+        if self.number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.number - 1)
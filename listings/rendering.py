@@ -0,0 +1,274 @@
+"""
+Fast serialization and JSON rendering for collection pages.
+
+Serializing a page through DRF builds a model instance per row and then
+walks every field of every serializer, which dominates the CPU time of
+large pages. When a serializer only reads columns (local fields, foreign
+key ids, annotations and nested serializers of single relations, as the
+collection serializers do), `row_serializer` compiles it once into a
+function building the same dict straight from a `values_list()` row.
+Decimals, datetimes and choices still go through the DRF field's own
+to_representation, so the output does not change; only ISO 8601
+datetimes skip its per-value timezone lookup while UTC is the current
+timezone, a page at a time.
+
+FastJSONRenderer encodes pages of those rows with orjson when it is
+installed. orjson writes some values differently from the json module
+(1e-05 as 0.00001, for one), so it is only used when every value is one
+both encode alike; otherwise, and without orjson, JSONRenderer runs. Set
+LISTINGS_FAST_SERIALIZATION = False to serialize every page through DRF.
+"""
+import copy
+import datetime
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, relations, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+from . import instrumentation
+from .serializers import SparseFieldsetMixin
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Serializer fields whose to_representation returns the values of these
+# model fields unchanged
+IDENTITY_FIELDS = {
+    serializers.CharField: (models.CharField, models.TextField),
+    serializers.EmailField: (models.CharField,),
+    serializers.IntegerField: (models.IntegerField,),
+    serializers.BooleanField: (models.BooleanField,),
+    serializers.FloatField: (models.FloatField,),
+    serializers.JSONField: (models.JSONField,),
+}
+
+# Values orjson may write differently from the json module
+CHECKED_FIELDS = (serializers.FloatField, serializers.JSONField)
+
+# Serializer fields whose own to_representation is applied to column values
+CONVERTED_FIELDS = (
+    serializers.DecimalField, serializers.DateTimeField, serializers.DateField, serializers.ChoiceField,
+)
+
+# Compiled RowSerializers by serializer class, fields and annotations, least
+# recently used first; ?fields= and ?expand= let clients vary the key
+MAX_COMPILED = 256
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def is_plain(value):
+    """Whether orjson encodes `value` exactly as the json module does"""
+    if value is None or isinstance(value, (str, bool, PlainRows)):
+        return True
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 64
+    if isinstance(value, float):
+        # Both write the shortest repr, but disagree on when to use exponents
+        return value == 0 or 1e-4 <= abs(value) < 1e16
+    if isinstance(value, (list, tuple)):
+        return all(map(is_plain, value))
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and is_plain(item) for key, item in value.items())
+    return False
+
+
+def dumps(data):
+    """`data` as compact JSON bytes, exactly as json.dumps writes it"""
+    if orjson is not None and is_plain(data):
+        try:
+            return orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class PlainRows(list):
+    """Represented rows already checked with is_plain"""
+
+
+class RowSerializer:
+    """A serializer compiled to represent `values_list()` rows (see row_serializer)"""
+
+    def __init__(self, columns, represent, represent_utc, checked):
+        self.columns = columns
+        self.represent = represent
+        # The same, for when UTC is the current timezone
+        self.represent_utc = represent_utc
+        # Columns whose values orjson may not write like the json module
+        self.checked = checked
+
+    def rows(self, queryset):
+        """
+        The queryset's rows as named tuples of the columns read, plus pk and
+        created_at for keyset pagination
+        """
+        columns = list(self.columns)
+        for name in ('pk', 'created_at'):
+            if name not in columns:
+                columns.append(name)
+        return queryset.prefetch_related(None).values_list(*columns, named=True)
+
+    def to_representation(self, row):
+        return self.represent(row)
+
+    def page(self, rows):
+        """Represent a page of rows, marked as PlainRows when orjson may encode them"""
+        represent = self.represent
+        if settings.USE_TZ and timezone.get_current_timezone_name() == 'UTC':
+            represent = self.represent_utc
+        with instrumentation.span('serialize'):
+            data = [represent(row) for row in rows]
+            if all(is_plain(row[index]) for row in rows for index in self.checked):
+                return PlainRows(data)
+            return data
+
+
+def _utc_datetime(field):
+    """
+    field.to_representation for aware datetimes while UTC is the current
+    timezone, or None if the field does not write them in ISO 8601 there
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if type(field) is not serializers.DateTimeField or hasattr(field, 'timezone') or output_format is None:
+        return None
+    if output_format.lower() != ISO_8601:
+        return None
+    to_representation = field.to_representation
+
+    def represent(value):
+        if isinstance(value, str) or value.tzinfo is None:
+            return to_representation(value)
+        value = value.astimezone(datetime.timezone.utc).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return represent
+
+
+def _plan(serializer, model, prefix, columns, converters, checked, annotations):
+    """
+    Python source building the serializer's dict from a row, adding the
+    columns it reads; None if it reads anything but columns
+    """
+    if type(serializer).to_representation not in (
+        serializers.Serializer.to_representation, SparseFieldsetMixin.to_representation
+    ):
+        return None
+
+    def column(name):
+        if name not in columns:
+            columns.append(name)
+        return columns.index(name)
+
+    items = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        source = field.source
+        if '.' in source or source == '*':
+            return None
+        if not prefix and source in annotations:
+            model_field = annotations[source].output_field
+        else:
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer) or not model_field.is_relation:
+                return None
+            nested = _plan(
+                field, model_field.related_model, f'{prefix}{source}__', columns, converters, checked, annotations
+            )
+            if nested is None:
+                return None
+            # A null foreign key renders the whole nested serializer as None
+            expression = f'None if row[{column(prefix + source)}] is None else {nested}'
+        elif model_field.is_relation:
+            if type(field) is not relations.PrimaryKeyRelatedField or field.pk_field is not None:
+                return None
+            expression = f'row[{column(prefix + source)}]'
+        elif isinstance(model_field, IDENTITY_FIELDS.get(type(field), ())) and not getattr(field, 'binary', False):
+            index = column(prefix + source)
+            if type(field) in CHECKED_FIELDS:
+                checked.append(index)
+            expression = f'row[{index}]'
+        elif type(field) in CONVERTED_FIELDS:
+            index = column(prefix + source)
+            # Unbound copies, so the cache keeps no request alive
+            field = copy.deepcopy(field)
+            converters.append((field.to_representation, _utc_datetime(field) or field.to_representation))
+            # Fields never see None; it renders as None
+            expression = f'None if row[{index}] is None else c{len(converters) - 1}(row[{index}])'
+        else:
+            return None
+        items.append(f'{name!r}: {expression}')
+    return '{' + ', '.join(items) + '}'
+
+
+def row_serializer(serializer, queryset):
+    """
+    A RowSerializer representing the queryset's rows exactly as `serializer`
+    represents its instances, or None if it cannot
+    """
+    if not getattr(settings, 'LISTINGS_FAST_SERIALIZATION', True):
+        return None
+    annotations = queryset.query.annotations
+    # ?fields= and ?expand= change the fields of a serializer class
+    key = (
+        type(serializer),
+        tuple((name, type(field)) for name, field in serializer.fields.items()),
+        frozenset(annotations),
+    )
+    with _compiled_lock:
+        if key in _compiled:
+            _compiled.move_to_end(key)
+            return _compiled[key]
+    columns, converters, checked = [], [], []
+    source = _plan(serializer, queryset.model, '', columns, converters, checked, annotations)
+    compiled = None
+    if source is not None:
+        represent = []
+        for utc in (False, True):
+            namespace = {f'c{index}': converter[utc] for index, converter in enumerate(converters)}
+            exec(f'def represent(row):\n    return {source}\n', namespace)
+            represent.append(namespace['represent'])
+        compiled = RowSerializer(columns, *represent, sorted(set(checked)))
+    with _compiled_lock:
+        _compiled[key] = compiled
+        if len(_compiled) > MAX_COMPILED:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer writing pages of PlainRows with orjson, when installed"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or not isinstance(data, dict) or not isinstance(data.get('results'), PlainRows)
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+            or not is_plain(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like JSONRenderer does
+        return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
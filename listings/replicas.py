@@ -0,0 +1,113 @@
+"""
+Read-replica routing.
+
+With LISTINGS_READ_REPLICAS set (see settings.py), ReplicaMiddleware
+picks one replica per safe request and ReplicaRouter sends that request's
+reads of listings and users there; writes, every other model, and all
+queries outside requests use `default`. A paginated page and its count
+thus come from the same replica.
+
+Replicas lag behind the primary, so a client that has just written (a
+successful POST, PUT, PATCH or DELETE, e.g. a booking or a review) gets a
+cookie pinning its reads to the primary for LISTINGS_REPLICA_PIN_SECONDS,
+and reads its own writes. Misses of the anonymous response cache also
+read the primary (see primary_reads): a replica's pre-write answer
+cached under the version the write bumped would outlive the replica's
+lag. Locally the replicas are SQLite files refreshed
+by `sync_replicas`, a stand-in for real replication.
+"""
+import random
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Apps whose reads may be served by a replica; sessions, for one, are read
+# right after they are written
+REPLICATED_APPS = ('listings', 'auth')
+
+PIN_COOKIE = 'listings_read_primary'
+
+_read_alias = ContextVar('listings_read_alias', default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'LISTINGS_READ_REPLICAS', []))
+
+
+def pin_seconds():
+    return getattr(settings, 'LISTINGS_REPLICA_PIN_SECONDS', 10)
+
+
+class ReplicaRouter:
+    """Route reads to the replica chosen for the current request"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICATED_APPS:
+            return _read_alias.get() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db not in replica_aliases()
+
+
+class ReplicaMiddleware:
+    """Serve each safe request's reads from one replica, unless the client has just written"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = replica_aliases()
+        writes = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        alias = None
+        if replicas and not writes and PIN_COOKIE not in request.COOKIES:
+            alias = random.choice(replicas)
+        token = _read_alias.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+        if replicas and writes and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(), httponly=True, samesite='Lax')
+        return response
+
+
+@contextmanager
+def primary_reads():
+    """Send the current request's reads to the primary inside the block"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def sync_replicas(aliases=None):
+    """
+    Copy the primary SQLite database onto each replica with SQLite's
+    online backup, a consistent snapshot even while it is being written
+    """
+    aliases = replica_aliases() if aliases is None else aliases
+    source = sqlite3.connect(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+    try:
+        for alias in aliases:
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+    return aliases
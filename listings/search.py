@@ -0,0 +1,75 @@
+"""
+Full-text search over listings.
+
+The backend is chosen with the LISTINGS_SEARCH_BACKEND setting (a dotted
+path). By default SQLite uses the FTS5 index created by migration 0005
+and ranks matches by BM25; other databases fall back to case-insensitive
+substring matching ordered by recency.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+SEARCH_FIELDS = ('title', 'description', 'city', 'amenities')
+
+
+def terms(query):
+    """The words of a free-text query; punctuation and operators are dropped"""
+    return re.findall(r'\w+', query)
+
+
+class BasicSearchBackend:
+    """Match every term as a substring of any searched field"""
+
+    def search(self, queryset, query):
+        for term in terms(query):
+            match = Q()
+            for field in SEARCH_FIELDS:
+                match |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(match)
+        return queryset
+
+
+class SQLiteFTSBackend:
+    """
+    Match every term (or a word starting with the last term, so results
+    follow the user's typing) against the FTS5 index, best BM25 rank first.
+    """
+    table = 'listings_listing_fts'
+
+    def match_expression(self, query):
+        words = terms(query)
+        if not words:
+            return None
+        # Quoting each word keeps user input out of the FTS5 query syntax
+        return ' '.join(f'"{word}"' for word in words) + '*'
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if match is None:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[self.table],
+            where=[f'{self.table}.rowid = {table}.id', f'{self.table} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'bm25({self.table})'},
+            order_by=['search_rank', 'id'],
+        )
+
+
+def get_backend():
+    path = getattr(settings, 'LISTINGS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return BasicSearchBackend()
+
+
+def search_listings(queryset, query):
+    """Narrow a Listing queryset to matches for `query`, best first"""
+    return get_backend().search(queryset, query)
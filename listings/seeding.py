@@ -0,0 +1,225 @@
+"""
+Bulk generation of sample data for `manage.py seed --bulk`.
+
+Rows are generated per batch of listings: a batch owns its listings'
+bookings and reviews, so overlapping stays and duplicate (listing,
+reviewer) pairs are ruled out in memory without querying. Each batch draws
+from its own RNG seeded with (seed, batch number), which keeps the output
+identical whether batches are generated in this process or by a pool of
+workers. Generation touches no models, so workers never need the database;
+`insert_batch` writes a generated batch in the main process.
+"""
+import random
+from datetime import date, timedelta
+
+from .aggregates import recompute_ratings, recompute_review_summaries
+from .amenities import link_amenities
+from .availability import nights_between
+from .facets import add_facets
+from .models import Booking, Listing, ListingNight, Review
+
+CITIES = [
+    ('New York', 'NY', 'USA'),
+    ('Los Angeles', 'CA', 'USA'),
+    ('Chicago', 'IL', 'USA'),
+    ('Miami', 'FL', 'USA'),
+    ('San Francisco', 'CA', 'USA'),
+    ('Paris', 'Île-de-France', 'France'),
+    ('London', 'England', 'UK'),
+    ('Tokyo', 'Tokyo', 'Japan'),
+    ('Sydney', 'NSW', 'Australia'),
+    ('Toronto', 'ON', 'Canada'),
+]
+
+# City centres as (latitude, longitude)
+CITY_CENTERS = {
+    'New York': (40.7128, -74.0060),
+    'Los Angeles': (34.0522, -118.2437),
+    'Chicago': (41.8781, -87.6298),
+    'Miami': (25.7617, -80.1918),
+    'San Francisco': (37.7749, -122.4194),
+    'Paris': (48.8566, 2.3522),
+    'London': (51.5074, -0.1278),
+    'Tokyo': (35.6762, 139.6503),
+    'Sydney': (-33.8688, 151.2093),
+    'Toronto': (43.6532, -79.3832),
+}
+
+PROPERTY_TYPES = ['apartment', 'house', 'villa', 'cabin', 'condo']
+
+STREETS = ['Main St', 'Oak Ave', 'Pine Rd', 'Elm St']
+
+AMENITIES = [
+    ['WiFi', 'Kitchen', 'Free parking'],
+    ['WiFi', 'Kitchen', 'Pool', 'Gym'],
+    ['WiFi', 'Kitchen', 'Balcony', 'Air conditioning'],
+    ['WiFi', 'Kitchen', 'Garden', 'BBQ'],
+    ['WiFi', 'Kitchen', 'Hot tub', 'Mountain view'],
+    ['WiFi', 'Kitchen', 'Beach access', 'Ocean view'],
+    ['WiFi', 'Kitchen', 'Fireplace', 'Ski storage'],
+    ['WiFi', 'Kitchen', 'Workspace', 'Coffee maker'],
+]
+
+BOOKING_STATUSES = ['pending', 'confirmed', 'completed', 'cancelled']
+
+SPECIAL_REQUESTS = [
+    '', 'Early check-in if possible', 'Late check-out requested',
+    'Extra towels needed', 'Quiet room preferred',
+]
+
+REVIEW_COMMENTS = [
+    'Great place to stay! Highly recommended.',
+    'Clean and comfortable. Perfect location.',
+    'Amazing views and excellent amenities.',
+    'Good value for money. Would stay again.',
+    'Nice property but could use some updates.',
+    'Fantastic experience! The host was very helpful.',
+    'Beautiful property with everything we needed.',
+    'Peaceful location with great amenities.',
+    'Excellent communication with the host.',
+    'Wonderful stay, exceeded our expectations.',
+]
+
+# Statuses that hold nights, mirroring Booking.OCCUPYING_STATUSES
+OCCUPYING_STATUSES = ('pending', 'confirmed', 'completed')
+
+
+def coordinates(rng, city):
+    """A point scattered around the city's centre, most within about 20 km"""
+    latitude, longitude = CITY_CENTERS[city]
+    return round(latitude + rng.gauss(0, 0.08), 6), round(longitude + rng.gauss(0, 0.1), 6)
+
+
+def _share(total, listings, index):
+    """Rows of `total` owed to the listing at `index`, spread evenly"""
+    return (index + 1) * total // listings - index * total // listings
+
+
+def _other_user(rng, user_ids, host_id):
+    """A random user other than the host, who never books or reviews their own listing"""
+    if len(user_ids) < 2:
+        return None
+    while True:
+        user_id = rng.choice(user_ids)
+        if user_id != host_id:
+            return user_id
+
+
+def generate_batch(task):
+    """
+    Generate one batch of rows.
+
+    `task` is (seed, batch number, first listing index, last listing index,
+    total listings, total bookings, total reviews, today, user ids). Returns
+    (listings, bookings, reviews) where listings are field dicts and
+    bookings/reviews are (listing offset in batch, field dict) pairs.
+    """
+    seed, number, start, stop, total, booking_total, review_total, today, user_ids = task
+    rng = random.Random(f'{seed}:{number}')
+    listings, bookings, reviews = [], [], []
+
+    for offset, index in enumerate(range(start, stop)):
+        city, state, country = rng.choice(CITIES)
+        property_type = rng.choice(PROPERTY_TYPES)
+        host_id = rng.choice(user_ids)
+        latitude, longitude = coordinates(rng, city)
+        price = rng.randint(50, 500)
+        max_guests = rng.randint(2, 12)
+        listings.append({
+            'title': f'Beautiful {property_type.title()} in {city}',
+            'description': f'Stunning {property_type} located in the heart of {city}. '
+                           f'Perfect for your next vacation with all the amenities you need.',
+            'address': f'{rng.randint(100, 9999)} {rng.choice(STREETS)}',
+            'city': city,
+            'state': state,
+            'zipcode': f'{rng.randint(10000, 99999)}',
+            'country': country,
+            'latitude': latitude,
+            'longitude': longitude,
+            'price_per_night': price,
+            'bedrooms': rng.randint(1, 5),
+            'bathrooms': rng.randint(1, 4),
+            'max_guests': max_guests,
+            'property_type': property_type,
+            'amenities': rng.choice(AMENITIES),
+            'images': [
+                f'https://example.com/images/{property_type}_{index + 1}_1.jpg',
+                f'https://example.com/images/{property_type}_{index + 1}_2.jpg',
+            ],
+            'host_id': host_id,
+            'is_available': rng.random() < 0.75,
+        })
+
+        taken = set()
+        for _ in range(_share(booking_total, total, index)):
+            guest_id = _other_user(rng, user_ids, host_id)
+            if guest_id is None:
+                break
+            check_in = today + timedelta(days=rng.randint(1, 365))
+            nights = rng.randint(1, 14)
+            status = rng.choice(BOOKING_STATUSES)
+            stay = {check_in + timedelta(days=day) for day in range(nights)}
+            if status in OCCUPYING_STATUSES:
+                if stay & taken:
+                    continue
+                taken |= stay
+            bookings.append((offset, {
+                'guest_id': guest_id,
+                'check_in_date': check_in,
+                'check_out_date': check_in + timedelta(days=nights),
+                'num_guests': rng.randint(1, max_guests),
+                'total_price': price * nights,
+                'status': status,
+                'special_requests': rng.choice(SPECIAL_REQUESTS),
+            }))
+
+        reviewed = set()
+        for _ in range(_share(review_total, total, index)):
+            reviewer_id = _other_user(rng, user_ids, host_id)
+            if reviewer_id is None or reviewer_id in reviewed:
+                continue
+            reviewed.add(reviewer_id)
+            reviews.append((offset, {
+                'reviewer_id': reviewer_id,
+                'rating': rng.randint(1, 5),
+                'comment': rng.choice(REVIEW_COMMENTS),
+            }))
+
+    return listings, bookings, reviews
+
+
+def batches(seed, listings, bookings, reviews, batch_size, user_ids, today=None):
+    """The generate_batch tasks covering `listings` listings"""
+    today = today or date.today()
+    return [
+        (seed, number, start, min(start + batch_size, listings), listings, bookings, reviews, today, user_ids)
+        for number, start in enumerate(range(0, listings, batch_size))
+    ]
+
+
+def insert_batch(listing_rows, booking_rows, review_rows):
+    """
+    Insert one generated batch, returning the listing, booking and review
+    counts. bulk_create skips save() and signals, so the amenity index,
+    facet counts, occupied nights, rating totals and review summaries are
+    filled in here.
+    """
+    listings = Listing.objects.bulk_create([Listing(**row) for row in listing_rows])
+    link_amenities(listings)
+    add_facets(listings)
+    bookings = Booking.objects.bulk_create(
+        [Booking(listing=listings[offset], **row) for offset, row in booking_rows]
+    )
+    ListingNight.objects.bulk_create([
+        ListingNight(listing_id=booking.listing_id, booking=booking, night=night)
+        for booking in bookings if booking.stay is not None
+        for night in nights_between(booking.check_in_date, booking.check_out_date)
+    ])
+    reviews = Review.objects.bulk_create(
+        [Review(listing=listings[offset], **row) for offset, row in review_rows]
+    )
+    if listings:
+        batch = Listing.objects.filter(pk__gte=listings[0].pk, pk__lte=listings[-1].pk)
+        recompute_ratings(batch)
+        recompute_review_summaries(batch)
+    return len(listings), len(bookings), len(reviews)
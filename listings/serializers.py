@@ -1,16 +1,117 @@
+import math
+
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth.models import User
-from .models import Listing, Booking, Review
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from .models import Listing, Booking, Review, ReviewSummary
+from . import availability, instrumentation
+
+
+def _query_param_set(request, name):
+    """Parse a comma-separated query parameter into a set of names"""
+    return {value.strip() for value in request.query_params.get(name, '').split(',') if value.strip()}
+
+
+def _plan_fields(serializer, model, prefix, select, prefetch, annotations=()):
+    """
+    Collect the select_related/prefetch_related lookups the serializer's
+    fields need, and return the local columns they read (None if unknown).
+    Fields reading one of the queryset's `annotations` need no column.
+    """
+    columns = set()
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        name = field.source.split('.')[0]
+        if name in annotations:
+            continue
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # source='*', methods and properties may read anything
+            columns = None
+            continue
+        
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if model_field.concrete:
+            if columns is not None:
+                columns.add(name)
+            if model_field.is_relation and (isinstance(nested, serializers.BaseSerializer) or '.' in field.source):
+                select.append(prefix + name)
+                if isinstance(nested, serializers.BaseSerializer):
+                    _plan_fields(nested, model_field.related_model, f'{prefix}{name}__', select, prefetch)
+        elif model_field.is_relation:
+            related = model_field.related_model._default_manager.all()
+            if isinstance(nested, SparseFieldsetMixin) and model_field.one_to_many:
+                # Keep the foreign key so prefetched rows can be matched up
+                related = nested.optimize_queryset(related, keep=[model_field.field.name])
+            prefetch.append(Prefetch(prefix + name, queryset=related))
+    return columns
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets for API reads.
+    
+    On GET requests the top-level serializer keeps only the fields named in
+    `?fields=`, and renders relations named in `?expand=` with the richer
+    serializer from `expandable_fields`. `optimize_queryset` then loads just
+    the columns and relations the resulting fields read.
+    """
+    # Field name -> (serializer class, kwargs) used when the field is expanded
+    expandable_fields = {}
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self.is_top_level():
+            return fields
+        
+        requested = _query_param_set(request, 'fields')
+        expanded = _query_param_set(request, 'expand') & self.expandable_fields.keys()
+        for name in expanded:
+            serializer_class, kwargs = self.expandable_fields[name]
+            fields[name] = serializer_class(**kwargs)
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested or name in expanded}
+        return fields
+    
+    def to_representation(self, instance):
+        if not self.is_top_level():
+            return super().to_representation(instance)
+        with instrumentation.span('serialize'):
+            return super().to_representation(instance)
+    
+    def is_top_level(self):
+        """Whether this is the serializer (or list item) rendering the response"""
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+    
+    def optimize_queryset(self, queryset, keep=()):
+        """Restrict a queryset to the columns and relations this serializer reads"""
+        select, prefetch = [], []
+        columns = _plan_fields(self, queryset.model, '', select, prefetch, queryset.query.annotations)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if columns is not None:
+            queryset = queryset.only(*columns, *keep)
+        return queryset
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for User model"""
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'email']
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Review model"""
     reviewer = UserSerializer(read_only=True)
     
@@ -20,41 +121,83 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ['reviewer', 'created_at']
 
 
-class ListingSerializer(serializers.ModelSerializer):
+class ReviewSummarySerializer(serializers.ModelSerializer):
+    """A listing's rating histogram, from its ReviewSummary"""
+    histogram = serializers.SerializerMethodField()
+    review_count = serializers.IntegerField(read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = ReviewSummary
+        fields = ['listing', 'review_count', 'average_rating', 'histogram', 'latest_review_at']
+        read_only_fields = fields
+    
+    def get_histogram(self, summary):
+        # JSON object keys are strings
+        return {str(stars): count for stars, count in summary.histogram.items()}
+
+
+class ListingSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Listing model"""
     host = UserSerializer(read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Listing
         fields = [
             'id', 'title', 'description', 'address', 'city', 'state', 
-            'zipcode', 'country', 'price_per_night', 'bedrooms', 'bathrooms',
+            'zipcode', 'country', 'latitude', 'longitude', 'price_per_night', 'bedrooms', 'bathrooms',
             'max_guests', 'property_type', 'amenities', 'images', 'host',
             'is_available', 'created_at', 'updated_at', 'reviews',
             'average_rating', 'review_count'
         ]
         read_only_fields = ['host', 'created_at', 'updated_at', 'average_rating', 'review_count']
+
+
+class ListingListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Compact serializer for Listing collections"""
+    host = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandable_fields = {
+        'host': (UserSerializer, {'read_only': True}),
+        'reviews': (ReviewSerializer, {'many': True, 'read_only': True}),
+    }
     
-    def get_average_rating(self, obj):
-        """Calculate average rating for the listing"""
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
+    class Meta:
+        model = Listing
+        fields = [
+            'id', 'title', 'city', 'state', 'country', 'latitude', 'longitude', 'price_per_night',
+            'bedrooms', 'bathrooms', 'max_guests', 'property_type', 'amenities',
+            'images', 'host', 'is_available', 'average_rating', 'review_count',
+            'created_at'
+        ]
+        read_only_fields = fields
+
+
+class NearbyListingSerializer(ListingListSerializer):
+    """Compact serializer for nearby listings, with their distance from the searched point"""
+    distance_km = serializers.FloatField(read_only=True)
     
-    def get_review_count(self, obj):
-        """Get the number of reviews for the listing"""
-        return obj.reviews.count()
+    class Meta(ListingListSerializer.Meta):
+        fields = ListingListSerializer.Meta.fields + ['distance_km']
+        read_only_fields = fields
+
 
+class ListingSummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Minimal listing representation embedded in bookings"""
+    class Meta:
+        model = Listing
+        fields = ['id', 'title', 'city', 'price_per_night']
+        read_only_fields = fields
 
-class BookingSerializer(serializers.ModelSerializer):
+
+class BookingSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Booking model"""
-    listing = ListingSerializer(read_only=True)
+    listing = ListingSummarySerializer(read_only=True)
     guest = UserSerializer(read_only=True)
     listing_id = serializers.IntegerField(write_only=True)
+    expandable_fields = {
+        'listing': (ListingSerializer, {'read_only': True}),
+    }
     
     class Meta:
         model = Booking
@@ -66,14 +209,14 @@ class BookingSerializer(serializers.ModelSerializer):
         read_only_fields = ['guest', 'total_price', 'created_at', 'updated_at']
     
     def validate(self, data):
-        """Validate booking data"""
+        """Validate booking data, resolving the listing once for the checks and the save"""
         # Check if check-out date is after check-in date
         if data['check_out_date'] <= data['check_in_date']:
             raise serializers.ValidationError("Check-out date must be after check-in date")
         
         # Check if listing exists and is available
         try:
-            listing = Listing.objects.get(id=data['listing_id'])
+            listing = Listing.objects.get(id=data.pop('listing_id'))
             if not listing.is_available:
                 raise serializers.ValidationError("This listing is not available")
             
@@ -81,23 +224,103 @@ class BookingSerializer(serializers.ModelSerializer):
             if data['num_guests'] > listing.max_guests:
                 raise serializers.ValidationError(f"Maximum {listing.max_guests} guests allowed")
             
+            # Check that no other booking holds any of the requested nights
+            if not availability.is_free(
+                listing.id, data['check_in_date'], data['check_out_date'], exclude_booking=self.instance
+            ):
+                raise serializers.ValidationError("This listing is already booked for the selected dates")
+            
         except Listing.DoesNotExist:
             raise serializers.ValidationError("Listing not found")
         
+        # Booking.save prices the stay from this instance, and the response
+        # renders it, without reading the listing again
+        data['listing'] = listing
         return data
     
     def create(self, validated_data):
-        """Create booking with listing reference"""
-        listing_id = validated_data.pop('listing_id')
-        listing = Listing.objects.get(id=listing_id)
-        validated_data['listing'] = listing
+        """Create booking for the requesting user"""
         validated_data['guest'] = self.context['request'].user
         return super().create(validated_data)
 
 
+class BulkBookingSerializer(BookingSerializer):
+    """
+    One item of a bulk booking import. Listings and availability are
+    checked for the whole batch at once (see listings.bulk)
+    """
+    
+    def validate(self, data):
+        if data['check_out_date'] <= data['check_in_date']:
+            raise serializers.ValidationError("Check-out date must be after check-in date")
+        return data
+
+
 class ListingDetailSerializer(ListingSerializer):
     """Detailed serializer for Listing with more information"""
     bookings = BookingSerializer(many=True, read_only=True)
     
     class Meta(ListingSerializer.Meta):
-        fields = ListingSerializer.Meta.fields + ['bookings'] 
\ No newline at end of file
+        fields = ListingSerializer.Meta.fields + ['bookings'] 
+
+class ListingSearchSerializer(serializers.Serializer):
+    """Query parameters for searching listings by text and/or free stay dates"""
+    q = serializers.CharField(required=False, max_length=200)
+    check_in = serializers.DateField(required=False)
+    check_out = serializers.DateField(required=False)
+    
+    def validate(self, data):
+        """Require a text query or a stay, and validate the stay"""
+        if ('check_in' in data) != ('check_out' in data):
+            raise serializers.ValidationError("Check-in and check-out dates must be given together")
+        if 'check_in' in data and data['check_out'] <= data['check_in']:
+            raise serializers.ValidationError("Check-out date must be after check-in date")
+        if 'q' not in data and 'check_in' not in data:
+            raise serializers.ValidationError("Provide a search query (q) or check-in and check-out dates")
+        return data
+
+
+class NearbySearchSerializer(serializers.Serializer):
+    """Query parameters for finding listings around a point"""
+    MAX_RADIUS_KM = 100
+    
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(required=False, default=10, max_value=MAX_RADIUS_KM)
+    
+    def validate_radius(self, value):
+        """Require a positive radius, in kilometres"""
+        if value <= 0:
+            raise serializers.ValidationError("Radius must be positive")
+        return value
+    
+    def validate(self, data):
+        """Reject NaN, which slips past the range checks"""
+        if not all(math.isfinite(data[name]) for name in ('lat', 'lng', 'radius')):
+            raise serializers.ValidationError("lat, lng and radius must be numbers")
+        return data
+
+
+class ListingFilterSerializer(serializers.Serializer):
+    """Query parameters filtering listing collections"""
+    city = serializers.CharField(required=False)
+    country = serializers.CharField(required=False)
+    property_type = serializers.ChoiceField(choices=Listing.PROPERTY_TYPES, required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    bedrooms = serializers.IntegerField(required=False, min_value=0)
+    guests = serializers.IntegerField(required=False, min_value=1)
+    amenities = serializers.CharField(required=False)
+    
+    def validate_amenities(self, value):
+        """Split the comma-separated amenity names"""
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        if not names:
+            raise serializers.ValidationError("Name at least one amenity")
+        return names
+    
+    def validate(self, data):
+        """Validate the price range"""
+        if 'min_price' in data and 'max_price' in data and data['max_price'] < data['min_price']:
+            raise serializers.ValidationError("max_price must not be below min_price")
+        return data
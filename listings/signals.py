@@ -0,0 +1,111 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .aggregates import apply_rating_change, apply_summary_change, recompute_ratings, recompute_review_summaries
+from .amenities import sync_listing_amenities
+from .availability import sync_booking_nights
+from .cache import invalidate_listing
+from .facets import apply_facet_change, refresh_facets
+from .models import Booking, Listing, Review
+
+
+def _recompute_listings(*listing_ids):
+    listings = Listing.objects.filter(pk__in=listing_ids)
+    recompute_ratings(listings)
+    recompute_review_summaries(listings)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    """Fold a created or edited review into its listing's rating totals and summary"""
+    if raw:
+        return
+    if created:
+        apply_rating_change(instance.listing_id, instance.rating, 1)
+        apply_summary_change(instance.listing_id, added=instance.rating, reviewed_at=instance.created_at)
+    elif instance._original_rating is None:
+        # Loaded with deferred fields, so the previous rating is unknown
+        _recompute_listings(instance.listing_id, instance._original_listing_id)
+    elif instance.listing_id != instance._original_listing_id:
+        apply_rating_change(instance._original_listing_id, -instance._original_rating, -1)
+        apply_rating_change(instance.listing_id, instance.rating, 1)
+        apply_summary_change(instance._original_listing_id, removed=instance._original_rating)
+        apply_summary_change(instance.listing_id, added=instance.rating, reviewed_at=instance.created_at)
+    elif instance.rating != instance._original_rating:
+        apply_rating_change(instance.listing_id, instance.rating - instance._original_rating, 0)
+        apply_summary_change(instance.listing_id, added=instance.rating, removed=instance._original_rating)
+    invalidate_listing(instance.listing_id)
+    if instance._original_listing_id not in (None, instance.listing_id):
+        invalidate_listing(instance._original_listing_id)
+    instance._original_listing_id = instance.listing_id
+    instance._original_rating = instance.rating
+
+
+@receiver(pre_delete, sender=Review)
+def review_deleting(sender, instance, **kwargs):
+    """Load the persisted rating of a review fetched with deferred fields"""
+    if instance._original_rating is None:
+        instance.refresh_from_db(fields=['listing', 'rating'])
+        instance._original_listing_id = instance.listing_id
+        instance._original_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Remove a deleted review from its listing's rating totals and summary"""
+    apply_rating_change(instance._original_listing_id, -instance._original_rating, -1)
+    apply_summary_change(instance._original_listing_id, removed=instance._original_rating)
+    invalidate_listing(instance._original_listing_id)
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep the occupied-nights index in step with the booking's stay"""
+    if raw:
+        return
+    if created or instance.stay != instance._original_stay:
+        sync_booking_nights(instance, created=created)
+    instance._original_stay = instance.stay
+
+
+@receiver(post_save, sender=Listing)
+def listing_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Keep the amenity index and facet counts in step with the listing"""
+    if raw:
+        return
+    if created or instance.amenities != instance._original_amenities:
+        sync_listing_amenities(instance, created=created)
+    instance._original_amenities = instance.amenities
+    
+    if created:
+        apply_facet_change(added=instance.facet_values)
+    elif update_fields is None or not set(update_fields).isdisjoint(Listing.FACET_FIELDS):
+        if instance._original_facet is None or instance.loaded_facet_values() is None:
+            # Loaded with deferred fields, so a combination is unknown
+            refresh_facets()
+        else:
+            apply_facet_change(added=instance.facet_values, removed=instance._original_facet)
+    instance._original_facet = instance.loaded_facet_values()
+
+
+@receiver(post_delete, sender=Listing)
+def listing_deleted(sender, instance, **kwargs):
+    """Stop counting a deleted listing in the facet counts"""
+    if instance._original_facet is None:
+        refresh_facets()
+    else:
+        apply_facet_change(removed=instance._original_facet)
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def listing_changed(sender, instance, **kwargs):
+    """Expire cached responses that render the listing"""
+    invalidate_listing(instance.pk)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    """Expire the cached detail of the booked listing, which nests bookings"""
+    invalidate_listing(instance.listing_id, collection=False)
@@ -0,0 +1,38 @@
+"""
+Newline-delimited JSON streaming for large result sets.
+
+Rows are read with QuerySet.iterator(chunk_size=...), which also applies
+prefetch_related per chunk, and each row is serialized and written as it
+is read, so exports of any size run in flat memory. The serializer may be
+a listings.rendering.RowSerializer over values_list() rows. Async views
+stream the same documents from QuerySet.aiterator(), so under ASGI a slow
+client holds no thread while it drains the export.
+"""
+from django.http import StreamingHttpResponse
+
+from .rendering import dumps
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def _document(serializer, obj):
+    # Same encoding as the API's JSONRenderer
+    return dumps(serializer.to_representation(obj)) + b'\n'
+
+
+def iter_ndjson(queryset, serializer, chunk_size=500):
+    """Yield one JSON document per row, serialized with `serializer`"""
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield _document(serializer, obj)
+
+
+async def aiter_ndjson(queryset, serializer, chunk_size=500):
+    """iter_ndjson for async views, reading rows with the async ORM"""
+    async for obj in queryset.aiterator(chunk_size=chunk_size):
+        yield _document(serializer, obj)
+
+
+def ndjson_response(queryset, serializer, chunk_size=500, asynchronous=False):
+    """Stream a queryset as NDJSON, read through the async ORM if `asynchronous`"""
+    rows = (aiter_ndjson if asynchronous else iter_ndjson)(queryset, serializer, chunk_size)
+    return StreamingHttpResponse(rows, content_type=NDJSON_CONTENT_TYPE)
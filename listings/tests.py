@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .cache import get_cache
+from .models import Booking, Listing, Review
+
+
+class QueryCountTestCase(APITestCase):
+    """Endpoints run a fixed number of queries, however many rows they render"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.host = User.objects.create_user('host', password='password123')
+        self.guests = [User.objects.create_user(f'guest{i}', password='password123') for i in range(3)]
+
+    def create_listings(self, count):
+        """Add listings until there are `count`, each with reviews and bookings"""
+        for i in range(Listing.objects.count(), count):
+            listing = Listing.objects.create(
+                title=f'Listing {i}', description='A quiet place', address='1 Main St',
+                city='Paris', state='IDF', zipcode='75001', country='FR',
+                price_per_night=100 + i, bedrooms=2, bathrooms=1, max_guests=4,
+                property_type='apartment', amenities=['WiFi'], host=self.host,
+            )
+            for k, guest in enumerate(self.guests):
+                Review.objects.create(listing=listing, reviewer=guest, rating=1 + (i + k) % 5, comment='Nice')
+                check_in = date(2030, 1, 1) + timedelta(days=5 * k)
+                Booking.objects.create(
+                    listing=listing, guest=guest, check_in_date=check_in,
+                    check_out_date=check_in + timedelta(days=2), num_guests=2,
+                )
+        # Each measured request must miss the response cache
+        get_cache().clear()
+        return Listing.objects.order_by('pk').first()
+
+    def assertConstantQueries(self, num, url, user=None):
+        self.client.force_authenticate(user)
+        for count in (2, 10):
+            with self.subTest(listings=count):
+                self.create_listings(count)
+                with self.assertNumQueries(num):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list(self):
+        self.assertConstantQueries(2, '/api/listings/')
+
+    def test_retrieve(self):
+        listing = self.create_listings(1)
+        self.assertConstantQueries(3, f'/api/listings/{listing.pk}/')
+
+    def test_available(self):
+        self.assertConstantQueries(2, '/api/listings/available/')
+
+    def test_my_listings(self):
+        self.assertConstantQueries(2, '/api/listings/my_listings/', self.host)
+
+
+class BookingCreateQueryCountTestCase(APITestCase):
+    """POST /api/bookings/ reads the booked listing once"""
+
+    def setUp(self):
+        host = User.objects.create_user('host', password='password123')
+        self.guest = User.objects.create_user('guest', password='password123')
+        self.listing = Listing.objects.create(
+            title='Loft', description='A quiet place', address='1 Main St',
+            city='Paris', state='IDF', zipcode='75001', country='FR',
+            price_per_night=100, bedrooms=2, bathrooms=1, max_guests=4,
+            property_type='apartment', host=host,
+        )
+        self.client.force_authenticate(self.guest)
+
+    def book(self, check_in, check_out):
+        return self.client.post('/api/bookings/', {
+            'listing_id': self.listing.pk, 'check_in_date': check_in,
+            'check_out_date': check_out, 'num_guests': 2,
+        }, format='json')
+
+    def test_create(self):
+        # Listing, nights probe, then in the write transaction the nights
+        # re-check, booking, nights and notification job inserts
+        with self.assertNumQueries(10):
+            response = self.book('2030-05-01', '2030-05-04')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['total_price'], '300.00')
+
+    def test_create_rejected(self):
+        self.book('2030-05-01', '2030-05-04')
+        with self.assertNumQueries(2):
+            response = self.book('2030-05-03', '2030-05-05')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,6 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ListingViewSet, BookingViewSet, ReviewViewSet
+from .views import (
+    ListingViewSet, BookingViewSet, ReviewViewSet, metrics,
+    async_listing_list, async_listing_detail, async_listing_reviews,
+)
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
@@ -10,5 +13,10 @@ router.register(r'reviews', ReviewViewSet, basename='review')
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
+    path('_metrics/', metrics, name='metrics'),
+    # Async reads of listings and reviews, for ASGI deployments
+    path('async/listings/', async_listing_list, name='async-listing-list'),
+    path('async/listings/<int:pk>/', async_listing_detail, name='async-listing-detail'),
+    path('async/listings/<int:pk>/reviews/', async_listing_reviews, name='async-listing-reviews'),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
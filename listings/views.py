@@ -1,19 +1,104 @@
+import functools
+
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.views import exception_handler
 from django.contrib.auth.models import User
-from django.db import models
-from .models import Listing, Booking, Review
+from django.db import IntegrityError, connection, models, transaction
+from django.http import Http404
+from django.views.decorators.http import require_safe
+from .models import Listing, Booking, Review, ReviewSummary
 from .serializers import (
     ListingSerializer, 
     BookingSerializer, 
     ReviewSerializer,
+    ReviewSummarySerializer,
     UserSerializer,
-    ListingDetailSerializer
+    ListingDetailSerializer,
+    ListingListSerializer,
+    ListingSearchSerializer,
+    NearbyListingSerializer,
+    NearbySearchSerializer
 )
+from .cache import CachedReadMixin, cache_stats
+from .facets import facet_counts
+from .filters import ListingFilterBackend, filter_criteria
+from .geo import nearby_listings
+from .notifications import notify_booking
+from .pagination import KeysetPagination, ListPagination
+from .rendering import FastJSONRenderer, row_serializer
+from .streaming import ndjson_response
+from .search import search_listings
+from . import availability, bulk, instrumentation
+
+
+class CollectionResponseMixin:
+    """
+    Paginate collection responses, or stream them as NDJSON when the
+    request asks for `?stream=ndjson`.
+    """
+    stream_query_param = 'stream'
+    stream_chunk_size = 500
+    
+    def list(self, request, *args, **kwargs):
+        """List objects, paginated or streamed"""
+        return self.collection_response(self.filter_queryset(self.get_queryset()))
+    
+    def collection_response(self, queryset, serializer_class=None):
+        """
+        Build the paginated or streamed response for a queryset. Serializers
+        that only read columns render values_list() rows instead of model
+        instances (see listings.rendering).
+        """
+        serializer_class = serializer_class or self.get_serializer_class()
+        context = self.get_serializer_context()
+        serializer = serializer_class(context=context)
+        rows = row_serializer(serializer, queryset)
+        
+        stream = self.request.query_params.get(self.stream_query_param)
+        if stream:
+            if stream != 'ndjson':
+                raise ValidationError({self.stream_query_param: "Only 'ndjson' streaming is supported"})
+            if rows is not None:
+                return ndjson_response(rows.rows(queryset), rows, self.stream_chunk_size)
+            return ndjson_response(queryset, serializer, self.stream_chunk_size)
+        
+        if rows is not None:
+            page = self.paginate_queryset(rows.rows(queryset))
+            return self.get_paginated_response(rows.page(page))
+        page = self.paginate_queryset(queryset)
+        serializer = serializer_class(page, many=True, context=context)
+        return self.get_paginated_response(serializer.data)
 
 
-class ListingViewSet(viewsets.ModelViewSet):
+def bulk_response(request, create):
+    """
+    Run a bulk import of the request's list of items, reporting each item's
+    outcome: 201 when every item was created, 400 when none was, 207 otherwise
+    """
+    items = request.data
+    limit = bulk.max_items()
+    if not isinstance(items, list) or len(items) > limit:
+        return Response(
+            {"error": f"Expected a list of at most {limit} items"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    results = create(items)
+    created = sum(1 for result in results if result['status'] == status.HTTP_201_CREATED)
+    if created == len(results):
+        code = status.HTTP_201_CREATED
+    elif created == 0:
+        code = status.HTTP_400_BAD_REQUEST
+    else:
+        code = status.HTTP_207_MULTI_STATUS
+    return Response({'created': created, 'failed': len(results) - created, 'results': results}, status=code)
+
+
+class ListingViewSet(CachedReadMixin, CollectionResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for Listing model providing CRUD operations.
     
@@ -23,17 +108,71 @@ class ListingViewSet(viewsets.ModelViewSet):
     update: Update a listing
     partial_update: Partially update a listing
     destroy: Delete a listing
+    
+    Anonymous list, retrieve, reviews and rating-summary reads are served
+    from the response cache (see listings.cache). `bulk` creates thousands
+    of listings per request (see listings.bulk).
     """
     queryset = Listing.objects.all()
     serializer_class = ListingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = ListPagination
+    filter_backends = [ListingFilterBackend]
+    facets_query_param = 'facets'
+    
+    def get_queryset(self):
+        """
+        Return a queryset planned for the current action.
+        
+        Reads load exactly the columns and relations the response serializer
+        renders (see SparseFieldsetMixin.optimize_queryset), so a response
+        costs a fixed number of queries whatever the page size.
+        """
+        queryset = super().get_queryset()
+        if self.action in ('available', 'search', 'nearby'):
+            queryset = queryset.filter(is_available=True)
+        elif self.action == 'my_listings':
+            queryset = queryset.filter(host=self.request.user)
+        
+        if self.action == 'rating_summary':
+            # The listing only matters for the 404; join its summary row
+            return queryset.select_related('review_summary').only('pk', 'review_summary')
+        if self.action in ('reviews', 'add_review', 'nearby') or self.request.method not in permissions.SAFE_METHODS:
+            # nearby plans its queryset once the distance is annotated
+            return queryset
+        return self.get_serializer().optimize_queryset(queryset, keep=['created_at'])
     
     def get_serializer_class(self):
         """Return appropriate serializer class based on action"""
         if self.action == 'retrieve':
             return ListingDetailSerializer
+        if self.action in ('list', 'available', 'my_listings', 'search'):
+            return ListingListSerializer
+        if self.action == 'nearby':
+            return NearbyListingSerializer
         return ListingSerializer
     
+    def list(self, request, *args, **kwargs):
+        """List listings, with facet counts when `?facets=true`"""
+        return self.faceted_response(self.filter_queryset(self.get_queryset()))
+    
+    def faceted_response(self, queryset, materialized=True):
+        """
+        Build the collection response, adding facet counts for the whole
+        result set when asked. `materialized` says whether the listing
+        filters are all that narrowed the queryset, so the precomputed
+        ListingFacet counts may answer.
+        """
+        response = self.collection_response(queryset)
+        wants_facets = self.request.query_params.get(self.facets_query_param, '').lower() in ('true', '1')
+        if wants_facets and not response.streaming:
+            response.data['facets'] = facet_counts(
+                queryset,
+                filter_criteria(self.request) if materialized else None,
+                available_only=self.action == 'available',
+            )
+        return response
+    
     def perform_create(self, serializer):
         """Set the host to the current user when creating a listing"""
         serializer.save(host=self.request.user)
@@ -50,13 +189,33 @@ class ListingViewSet(viewsets.ModelViewSet):
             raise permissions.PermissionDenied("You can only delete your own listings")
         instance.delete()
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create many listings hosted by the current user in one request"""
+        return bulk_response(
+            request, lambda items: bulk.create_listings(items, request.user, self.get_serializer_context())
+        )
+    
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
         """Get all reviews for a specific listing"""
         listing = self.get_object()
-        reviews = listing.reviews.all()
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        # The related manager links each review back through listing_id
+        reviews = ReviewSerializer(context=self.get_serializer_context()).optimize_queryset(
+            listing.reviews.all(), keep=['created_at', 'listing']
+        )
+        return self.collection_response(reviews, ReviewSerializer)
+    
+    @action(detail=True, methods=['get'], url_path='rating-summary')
+    def rating_summary(self, request, pk=None):
+        """Get a listing's review count per star rating, without reading its reviews"""
+        listing = self.get_object()
+        try:
+            summary = listing.review_summary
+        except ReviewSummary.DoesNotExist:
+            # Listings get a summary row with their first review
+            summary = ReviewSummary(listing=listing)
+        return Response(ReviewSummarySerializer(summary).data)
     
     @action(detail=True, methods=['post'])
     def add_review(self, request, pk=None):
@@ -80,19 +239,61 @@ class ListingViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_listings(self, request):
         """Get all listings created by the current user"""
-        listings = Listing.objects.filter(host=request.user)
-        serializer = self.get_serializer(listings, many=True)
-        return Response(serializer.data)
+        return self.faceted_response(self.filter_queryset(self.get_queryset()), materialized=False)
     
     @action(detail=False, methods=['get'])
     def available(self, request):
         """Get all available listings"""
-        listings = Listing.objects.filter(is_available=True)
-        serializer = self.get_serializer(listings, many=True)
-        return Response(serializer.data)
+        return self.faceted_response(self.filter_queryset(self.get_queryset()))
+    
+    def reject_cursor(self, ordering):
+        """
+        Refuse `?cursor=` on ranked results: keyset pages follow (created_at,
+        id), which would silently replace the ranking
+        """
+        if KeysetPagination.cursor_query_param in self.request.query_params:
+            raise ValidationError({
+                KeysetPagination.cursor_query_param: f"Results ordered by {ordering} are paged with ?page=, not a cursor"
+            })
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Search available listings by text (ranked best match first) and/or
+        for listings free for every night of a stay
+        """
+        params = ListingSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        criteria = params.validated_data
+        
+        listings = self.filter_queryset(self.get_queryset())
+        if 'q' in criteria:
+            self.reject_cursor('relevance')
+            listings = search_listings(listings, criteria['q'])
+        if 'check_in' in criteria:
+            listings = availability.free_listings(listings, criteria['check_in'], criteria['check_out'])
+        
+        return self.faceted_response(listings, materialized=False)
+    
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """
+        Get available listings within `radius` km (default 10) of `lat`/`lng`,
+        nearest first, each with its `distance_km`
+        """
+        params = NearbySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        point = params.validated_data
+        self.reject_cursor('distance')
+        
+        listings = nearby_listings(
+            self.filter_queryset(self.get_queryset()), point['lat'], point['lng'], point['radius']
+        )
+        listings = self.get_serializer().optimize_queryset(listings, keep=['created_at'])
+        return self.faceted_response(listings, materialized=False)
 
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(CollectionResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for Booking model providing CRUD operations.
     
@@ -102,54 +303,93 @@ class BookingViewSet(viewsets.ModelViewSet):
     update: Update a booking
     partial_update: Partially update a booking
     destroy: Delete a booking
+    
+    Creating, confirming and cancelling a booking queue its notification
+    emails as a background job (see listings.notifications). `bulk` creates
+    thousands of bookings per request (see listings.bulk).
     """
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ListPagination
     
     def get_queryset(self):
         """Return bookings based on user role"""
         user = self.request.user
-        # Users can see their own bookings and bookings for their listings
-        return Booking.objects.filter(
-            models.Q(guest=user) | models.Q(listing__host=user)
-        )
+        if self.action == 'my_bookings':
+            queryset = Booking.objects.filter(guest=user)
+        elif self.action == 'my_hosted_bookings':
+            queryset = Booking.objects.filter(listing__in=Listing.objects.filter(host=user))
+        else:
+            # Users can see their own bookings and bookings for their listings.
+            # The subquery keeps both sides of the OR on an index.
+            queryset = Booking.objects.filter(
+                models.Q(guest=user) | models.Q(listing__in=Listing.objects.filter(host=user))
+            )
+        
+        if self.request.method not in permissions.SAFE_METHODS:
+            # Writes check ownership and render the booking afterwards
+            return queryset.select_related('listing', 'guest')
+        return self.get_serializer().optimize_queryset(queryset, keep=['created_at'])
     
     def perform_create(self, serializer):
         """Set the guest to the current user when creating a booking"""
-        serializer.save(guest=self.request.user)
+        data = serializer.validated_data
+        conflict = ValidationError("This listing is already booked for the selected dates")
+        try:
+            with transaction.atomic():
+                # Serialize bookings per listing, then re-check the nights
+                # now that no concurrent request can claim them. SQLite has
+                # no row locks: its write lock, taken at BEGIN, serializes them.
+                if connection.features.has_select_for_update:
+                    list(Listing.objects.select_for_update().filter(pk=data['listing'].pk).values_list('pk'))
+                if not availability.is_free(data['listing'].pk, data['check_in_date'], data['check_out_date']):
+                    raise conflict
+                notify_booking(serializer.save(guest=self.request.user))
+        except IntegrityError:
+            # A concurrent writer claimed a night first (unique listing/night)
+            raise conflict
     
     def perform_update(self, serializer):
         """Ensure only the guest or host can update the booking"""
         booking = serializer.instance
         user = self.request.user
         
-        if booking.guest != user and booking.listing.host != user:
+        if booking.guest_id != user.pk and booking.listing.host_id != user.pk:
             raise permissions.PermissionDenied("You can only edit your own bookings")
         
-        serializer.save()
+        try:
+            # The booking and its re-synced nights commit together, or not at all
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # A concurrent writer claimed a night first (unique listing/night)
+            raise ValidationError("This listing is already booked for the selected dates")
     
     def perform_destroy(self, instance):
         """Ensure only the guest or host can delete the booking"""
         user = self.request.user
         
-        if instance.guest != user and instance.listing.host != user:
+        if instance.guest_id != user.pk and instance.listing.host_id != user.pk:
             raise permissions.PermissionDenied("You can only delete your own bookings")
         
         instance.delete()
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create many bookings for the current user in one request"""
+        return bulk_response(
+            request, lambda items: bulk.create_bookings(items, request.user, self.get_serializer_context())
+        )
+    
     @action(detail=False, methods=['get'])
     def my_bookings(self, request):
         """Get all bookings made by the current user"""
-        bookings = Booking.objects.filter(guest=request.user)
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.collection_response(self.get_queryset())
     
     @action(detail=False, methods=['get'])
     def my_hosted_bookings(self, request):
         """Get all bookings for listings owned by the current user"""
-        bookings = Booking.objects.filter(listing__host=request.user)
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        return self.collection_response(self.get_queryset())
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -157,7 +397,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         booking = self.get_object()
         user = request.user
         
-        if booking.guest != user and booking.listing.host != user:
+        if booking.guest_id != user.pk and booking.listing.host_id != user.pk:
             raise permissions.PermissionDenied("You can only cancel your own bookings")
         
         if booking.status == 'cancelled':
@@ -166,8 +406,10 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'cancelled'
-        booking.save()
+        with transaction.atomic():
+            booking.status = 'cancelled'
+            booking.save()
+            notify_booking(booking)
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
     
@@ -176,7 +418,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         """Confirm a booking (host only)"""
         booking = self.get_object()
         
-        if booking.listing.host != request.user:
+        if booking.listing.host_id != request.user.pk:
             raise permissions.PermissionDenied("Only the host can confirm bookings")
         
         if booking.status != 'pending':
@@ -185,13 +427,15 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'confirmed'
-        booking.save()
+        with transaction.atomic():
+            booking.status = 'confirmed'
+            booking.save()
+            notify_booking(booking)
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(CollectionResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for Review model providing CRUD operations.
     
@@ -205,6 +449,14 @@ class ReviewViewSet(viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = ListPagination
+    
+    def get_queryset(self):
+        """Return reviews with only the columns and relations being rendered"""
+        queryset = super().get_queryset()
+        if self.request.method not in permissions.SAFE_METHODS:
+            return queryset
+        return self.get_serializer().optimize_queryset(queryset, keep=['created_at'])
     
     def perform_create(self, serializer):
         """Set the reviewer to the current user when creating a review"""
@@ -220,4 +472,109 @@ class ReviewViewSet(viewsets.ModelViewSet):
         """Ensure only the reviewer can delete their review"""
         if instance.reviewer != self.request.user:
             raise permissions.PermissionDenied("You can only delete your own reviews")
-        instance.delete() 
\ No newline at end of file
+        instance.delete() 
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics(request):
+    """Per-endpoint request metrics (see listings.instrumentation) and response cache hit counts"""
+    return Response({
+        'instrumentation': instrumentation.is_enabled(),
+        'endpoints': instrumentation.metrics_snapshot(),
+        'cache': cache_stats(ListingViewSet.cached_actions),
+    })
+
+
+# Async read path
+#
+# Under ASGI every request to the viewsets above holds a thread from start
+# to finish. These async views serve the same anonymous reads of listings
+# and their reviews through the async ORM, so only the queries themselves
+# run in a thread, and requests waiting on the database or on a slow client
+# cost a coroutine. Their JSON matches the viewsets' byte for byte; they
+# skip the response cache, whose version counters are read synchronously,
+# and the browsable API.
+
+
+def async_read(view):
+    """
+    Serve an async view to GET and HEAD requests with a DRF Request, and
+    render its Response, or the API error it raised, as JSON
+    """
+    @require_safe
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request = Request(request)
+        try:
+            response = await view(request, *args, **kwargs)
+        except (APIException, Http404) as exc:
+            response = exception_handler(exc, {'request': request})
+        if isinstance(response, Response):
+            response.accepted_renderer = FastJSONRenderer()
+            response.accepted_media_type = response.accepted_renderer.media_type
+            response.renderer_context = {'request': request, 'response': response}
+            response.render()
+        return response
+    return wrapper
+
+
+async def async_collection_response(request, queryset, serializer_class):
+    """CollectionResponseMixin.collection_response for the async views"""
+    context = {'request': request}
+    serializer = serializer_class(context=context)
+    rows = row_serializer(serializer, queryset)
+    
+    stream = request.query_params.get(CollectionResponseMixin.stream_query_param)
+    if stream:
+        if stream != 'ndjson':
+            raise ValidationError({CollectionResponseMixin.stream_query_param: "Only 'ndjson' streaming is supported"})
+        if rows is not None:
+            queryset, serializer = rows.rows(queryset), rows
+        return ndjson_response(queryset, serializer, CollectionResponseMixin.stream_chunk_size, asynchronous=True)
+    
+    paginator = ListPagination()
+    if rows is not None:
+        page = await paginator.apaginate_queryset(rows.rows(queryset), request)
+        return paginator.get_paginated_response(rows.page(page))
+    page = await paginator.apaginate_queryset(queryset, request)
+    return paginator.get_paginated_response(serializer_class(page, many=True, context=context).data)
+
+
+@async_read
+async def async_listing_list(request):
+    """Listings, filtered, paginated or streamed: GET /api/listings/ for ASGI"""
+    queryset = ListingListSerializer(context={'request': request}).optimize_queryset(
+        Listing.objects.all(), keep=['created_at']
+    )
+    # The amenity filter reads the index while it plans
+    queryset = await sync_to_async(ListingFilterBackend().filter_queryset)(request, queryset, None)
+    response = await async_collection_response(request, queryset, ListingListSerializer)
+    
+    wants_facets = request.query_params.get(ListingViewSet.facets_query_param, '').lower() in ('true', '1')
+    if wants_facets and not response.streaming:
+        response.data['facets'] = await sync_to_async(facet_counts)(queryset, filter_criteria(request))
+    return response
+
+
+@async_read
+async def async_listing_detail(request, pk):
+    """One listing with its reviews and bookings: GET /api/listings/{id}/ for ASGI"""
+    context = {'request': request}
+    queryset = ListingDetailSerializer(context=context).optimize_queryset(Listing.objects.all(), keep=['created_at'])
+    try:
+        listing = await queryset.aget(pk=pk)
+    except Listing.DoesNotExist:
+        raise Http404('No Listing matches the given query.')
+    return Response(ListingDetailSerializer(listing, context=context).data)
+
+
+@async_read
+async def async_listing_reviews(request, pk):
+    """A listing's reviews, paginated or streamed: GET /api/listings/{id}/reviews/ for ASGI"""
+    if not await Listing.objects.filter(pk=pk).aexists():
+        raise Http404('No Listing matches the given query.')
+    reviews = ReviewSerializer(context={'request': request}).optimize_queryset(
+        Review.objects.filter(listing_id=pk), keep=['created_at']
+    )
+    return await async_collection_response(request, reviews, ReviewSerializer)